@@ -0,0 +1,36 @@
+"""
+Entities and mixins for pygame games.
+
+Main classes can be imported from package directly, their modules (and pygame) are imported
+only on first access, so importing pygame_entities.utils.math does not import pygame.
+"""
+from importlib import import_module
+
+# name -> module, relative to this package
+_LAZY_EXPORTS = {
+    "Game": ".game",
+    "Entity": ".entities.entity",
+    "SpriteMixin": ".entities.mixins",
+    "CollisionMixin": ".entities.mixins",
+    "VelocityMixin": ".entities.mixins",
+    "BlockingCollisionMixin": ".entities.mixins",
+    "MouseEventMixin": ".entities.mixins",
+    "Vector2": ".utils.math",
+}
+
+__all__ = list(_LAZY_EXPORTS)
+
+
+def __getattr__(name: str):
+    module = _LAZY_EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(
+            "module {} has no attribute {}".format(__name__, name))
+
+    value = getattr(import_module(module, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,368 @@
+"""
+Memory diagnostics.
+
+memory_report counts live entities, sprites and surfaces, sizes of callback lists,
+and finds destroyed entities that are still kept in memory by subscriptions.
+MemorySampler entity takes reports periodically and logs growth of counts.
+
+Reports hold found entities and sprites, so they should not be kept for long.
+MemorySampler keeps only counts, ids and class names (see MemorySample).
+"""
+
+import gc
+import logging
+from collections import Counter, deque
+from functools import partial
+from typing import Any, Callable, Deque, Dict, Iterable, List, NamedTuple, Tuple, Union
+
+from .game import Game
+from .entities.entity import Entity, _live_entities
+from .utils.drawable import BaseSprite, _live_sprites, _text_cache, _glyph_atlases
+from .utils.spritesheets import _live_spritesheets
+from .utils.math import Vector2
+
+import pygame
+
+logger = logging.getLogger(__name__)
+
+
+class StaleSubscription(NamedTuple):
+    """
+    Callback that keeps destroyed entity in memory
+    """
+
+    # Where callback is subscribed, for example "event MouseMotion" or "update of Player 3"
+    source: str
+    callback: Callable
+    entity: Entity
+
+
+class MemoryReport(NamedTuple):
+    """
+    Result of memory_report function.
+
+    Report keeps found entities and sprites in memory, while it exists
+    """
+
+    # Not collected entities and sprites by class name (including destroyed and killed ones)
+    entities_by_class: Dict[str, int]
+    sprites_by_class: Dict[str, int]
+
+    # Entities that are in game and sprites that are drawn
+    registered_entities: int
+    drawn_sprites: int
+
+    # Bytes of pixels of surfaces, every surface is counted once
+    sprite_surface_bytes: int
+    spritesheet_surface_bytes: int
+    text_cache_surface_bytes: int
+
+    # Count of subscribed functions by kind
+    callbacks: Dict[str, int]
+
+    # Destroyed entities that are not collected
+    leaked_entities: List[Entity]
+    # Subscriptions that reference destroyed entities
+    stale_subscriptions: List[StaleSubscription]
+    # Sprites of entities in game, that were killed without hiding or destroying entity
+    orphaned_sprites: List[BaseSprite]
+
+    @property
+    def entities_count(self) -> int:
+        return sum(self.entities_by_class.values())
+
+    @property
+    def sprites_count(self) -> int:
+        return sum(self.sprites_by_class.values())
+
+    @property
+    def surface_bytes(self) -> int:
+        return self.sprite_surface_bytes + self.spritesheet_surface_bytes + self.text_cache_surface_bytes
+
+    @property
+    def callbacks_count(self) -> int:
+        return sum(self.callbacks.values())
+
+    def summary(self) -> str:
+        """
+        One line description of report
+        """
+        return "entities: {} ({} in game), sprites: {} ({} drawn), surfaces: {:.1f} KiB, callbacks: {}, " \
+            "leaked entities: {}, stale subscriptions: {}, orphaned sprites: {}".format(
+                self.entities_count, self.registered_entities,
+                self.sprites_count, self.drawn_sprites,
+                self.surface_bytes / 1024, self.callbacks_count,
+                len(self.leaked_entities), len(self.stale_subscriptions), len(self.orphaned_sprites),
+            )
+
+
+class MemorySample(NamedTuple):
+    """
+    Counts from memory report, without references to entities and sprites (kept by MemorySampler)
+    """
+
+    # Game time of sample
+    time: float
+
+    entities_by_class: Dict[str, int]
+    entities_count: int
+    registered_entities: int
+    sprites_count: int
+    drawn_sprites: int
+    surface_bytes: int
+    callbacks_count: int
+
+    # (class name, id) of destroyed not collected entities
+    leaked_entities: List[Tuple[str, int]]
+    # (source, class name, id) of entities kept by stale subscriptions
+    stale_subscriptions: List[Tuple[str, str, int]]
+    orphaned_sprites_count: int
+
+    @staticmethod
+    def from_report(time: float, report: MemoryReport) -> "MemorySample":
+        return MemorySample(
+            time=time,
+            entities_by_class=report.entities_by_class,
+            entities_count=report.entities_count,
+            registered_entities=report.registered_entities,
+            sprites_count=report.sprites_count,
+            drawn_sprites=report.drawn_sprites,
+            surface_bytes=report.surface_bytes,
+            callbacks_count=report.callbacks_count,
+            leaked_entities=[(type(entity).__name__, entity.id)
+                             for entity in report.leaked_entities],
+            stale_subscriptions=[
+                (subscription.source, type(
+                    subscription.entity).__name__, subscription.entity.id)
+                for subscription in report.stale_subscriptions
+            ],
+            orphaned_sprites_count=len(report.orphaned_sprites),
+        )
+
+
+def surface_bytes(surface: pygame.Surface) -> int:
+    """
+    Bytes of pixels of surface. Subsurfaces share pixels with parent, so they have 0 bytes
+    """
+    if surface.get_parent() is not None:
+        return 0
+    return surface.get_pitch() * surface.get_height()
+
+
+def _sum_surfaces_bytes(surfaces: Iterable[pygame.Surface]) -> int:
+    counted = dict()
+    for surface in surfaces:
+        if surface is not None:
+            counted[id(surface)] = surface
+    return sum(surface_bytes(surface) for surface in counted.values())
+
+
+def _sprite_surfaces(sprite: BaseSprite) -> Iterable[pygame.Surface]:
+    yield sprite.image
+    yield getattr(sprite, "_original_image", None)
+    yield from getattr(sprite, "_frames", ())
+
+
+def _referenced_entities(callback: Any, depth=2) -> Iterable[Entity]:
+    """
+    Entities referenced by bound method, partial or closure of callback
+    """
+    if isinstance(callback, Entity):
+        yield callback
+        return
+    if depth == 0:
+        return
+
+    if isinstance(callback, partial):
+        for value in (callback.func, *callback.args, *callback.keywords.values()):
+            yield from _referenced_entities(value, depth - 1)
+        return
+
+    owner = getattr(callback, "__self__", None)
+    if owner is not None:
+        yield from _referenced_entities(owner, depth - 1)
+        callback = getattr(callback, "__func__", callback)
+
+    for cell in getattr(callback, "__closure__", None) or ():
+        try:
+            value = cell.cell_contents
+        except ValueError:
+            # Empty cell
+            continue
+        if value is not callback:
+            yield from _referenced_entities(value, depth - 1)
+
+
+def _is_destroyed(entity: Entity) -> bool:
+    return entity.game.get_entity(entity.id) is not entity
+
+
+def _subscriptions(game: Game, entities: Iterable[Entity]) -> Iterable[Tuple[str, str, Callable]]:
+    """
+    Yields (kind, source, callback) for all subscribed functions of game and its entities
+    """
+    for event_type, subscribers in game._subscribed_events.items():
+        source = "event {}".format(pygame.event.event_name(event_type))
+        for callback in subscribers:
+            yield "events", source, callback
+
+    for layer, callback in game._draw_callbacks:
+        yield "draw", "draw on layer {}".format(layer), callback
+
+    for entity in entities:
+        for kind, attribute in (
+            ("update", "_on_update"),
+            ("parallel_update", "_on_parallel_update"),
+            ("destroy", "_on_destroy"),
+            ("collide", "on_collide_callbacks"),
+            ("trigger", "on_trigger_callbacks"),
+            ("mouse", "_on_mouse_down"),
+            ("mouse", "_on_mouse_up"),
+            ("mouse", "_on_mouse_motion"),
+        ):
+            callbacks = getattr(entity, attribute, None)
+            if callbacks:
+                source = "{} of {} {}".format(
+                    kind, type(entity).__name__, entity.id)
+                for callback in callbacks:
+                    yield kind, source, callback
+
+
+def memory_report(game: Union[Game, None] = None, collect_garbage=True) -> MemoryReport:
+    """
+    Makes report about memory of game.
+
+    collect_garbage - run gc.collect() first, so only really leaked objects are counted.
+    Entities keep references to themselves in subscribed bound methods, so without collecting
+    destroyed entities can stay in memory for some time
+    """
+    if game is None:
+        game = Game.get_instance()
+    if collect_garbage:
+        gc.collect()
+
+    entities = [entity for entity in list(_live_entities) if entity.game is game]
+    sprites = [sprite for sprite in list(_live_sprites) if sprite.game is game]
+    registered = [entity for entity in entities if not _is_destroyed(entity)]
+
+    callbacks: Dict[str, int] = Counter()
+    stale_subscriptions = list()
+    for kind, source, callback in _subscriptions(game, registered):
+        callbacks[kind] += 1
+        for entity in _referenced_entities(callback):
+            if _is_destroyed(entity):
+                stale_subscriptions.append(
+                    StaleSubscription(source, callback, entity))
+
+    orphaned_sprites = list()
+    for entity in registered:
+        sprite = getattr(entity, "_sprite", None)
+        if isinstance(sprite, BaseSprite) and sprite.visible and not sprite.alive():
+            orphaned_sprites.append(sprite)
+
+    return MemoryReport(
+        entities_by_class=dict(
+            Counter(type(entity).__name__ for entity in entities)),
+        sprites_by_class=dict(
+            Counter(type(sprite).__name__ for sprite in sprites)),
+        registered_entities=len(registered),
+        drawn_sprites=len(game._sprites),
+        sprite_surface_bytes=_sum_surfaces_bytes(
+            surface for sprite in sprites for surface in _sprite_surfaces(sprite)),
+        spritesheet_surface_bytes=_sum_surfaces_bytes(
+            spritesheet._spritesheet for spritesheet in list(_live_spritesheets)),
+        text_cache_surface_bytes=_sum_surfaces_bytes(
+            [*_text_cache.values(), *(surface for atlas in _glyph_atlases.values()
+                                      for surface in atlas._glyphs.values())]),
+        callbacks=dict(callbacks),
+        leaked_entities=[
+            entity for entity in entities if _is_destroyed(entity) and entity.id not in game._entities_for_delete
+        ],
+        stale_subscriptions=stale_subscriptions,
+        orphaned_sprites=orphaned_sprites,
+    )
+
+
+class MemorySampler(Entity):
+    """
+    Entity that takes memory reports every interval seconds of game time and logs them.
+
+    If count of entities, sprites, surface bytes or callbacks grows in warn_after samples in a row,
+    warning with growth per minute is logged. Stale subscriptions and orphaned sprites are logged as warnings too.
+    """
+
+    def __init__(
+        self,
+        interval=10.0,
+        history_size=30,
+        warn_after=5,
+        collect_garbage=True,
+        log: Union[logging.Logger, None] = None,
+        game: Union[Game, None] = None,
+    ) -> None:
+        super().__init__(Vector2(0, 0), game)
+
+        self.interval = interval
+        self.warn_after = warn_after
+        self.collect_garbage = collect_garbage
+        self.log = log if log is not None else logger
+
+        # Only counts are kept, so sampler does not keep leaked entities in memory
+        self.history: Deque[MemorySample] = deque(maxlen=history_size)
+        self._last_sample_time = self.game.time
+
+        self.subscribe_on_update(self._sample_on_interval)
+
+    def _sample_on_interval(self, _):
+        """
+        Runned every frame.
+        """
+        if self.game.time - self._last_sample_time < self.interval:
+            return
+        self._last_sample_time = self.game.time
+        self.sample()
+
+    def sample(self) -> MemorySample:
+        """
+        Takes report right now, adds counts from it into history and logs them.
+
+        Use memory_report function to get found entities and sprites
+        """
+        report = memory_report(self.game, self.collect_garbage)
+        summary = report.summary()
+        sample = MemorySample.from_report(self.game.time, report)
+        del report
+        self.history.append(sample)
+
+        self.log.info("Memory: %s", summary)
+        for source, class_name, entity_id in sample.stale_subscriptions:
+            self.log.warning("Destroyed %s %s is kept by %s",
+                             class_name, entity_id, source)
+        if sample.orphaned_sprites_count:
+            self.log.warning("%s sprites were killed without destroying their entities",
+                             sample.orphaned_sprites_count)
+
+        for name, growth in self.growth().items():
+            self.log.warning(
+                "Possible leak: %s grows by %.1f per minute", name, growth)
+
+        return sample
+
+    def growth(self) -> Dict[str, float]:
+        """
+        Growth per minute of values, that grew in each of last warn_after samples
+        """
+        if len(self.history) <= self.warn_after:
+            return dict()
+
+        samples = list(self.history)[-self.warn_after - 1:]
+        minutes = (samples[-1].time - samples[0].time) / 60
+        if minutes <= 0:
+            return dict()
+
+        result = dict()
+        for name in ("entities_count", "sprites_count", "surface_bytes", "callbacks_count"):
+            values = [getattr(sample, name) for sample in samples]
+            if all(a < b for a, b in zip(values, values[1:])):
+                result[name] = (values[-1] - values[0]) / minutes
+        return result
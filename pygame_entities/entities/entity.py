@@ -3,10 +3,18 @@ Base entity class.
 """
 
 from types import FunctionType, MethodType
-from typing import Union
+from typing import Callable, List, Union
+from weakref import WeakSet
+import struct
 from ..utils.math import Vector2
 from ..game import Game
 
+# position x, position y, enabled
+_ENTITY_STATE = struct.Struct("<ff?")
+
+# All not collected entities, used by diagnostics
+_live_entities: "WeakSet[Entity]" = WeakSet()
+
 
 class Entity:
     """
@@ -17,30 +25,59 @@ class Entity:
     Every entity in your game must be inherited from this class
     """
 
-    def __init__(self, position: Vector2) -> None:
+    # If True, entity can be updated less often when game is slow (see Game.degraded_update_interval).
+    # Update functions get sum of skipped delta times, so they need to use delta time
+    # (VelocityMixin moves entity by velocity of all skipped frames)
+    degradable_updates = False
+
+    # Delta time of updates skipped by degraded_update_interval
+    _skipped_delta_time = 0.0
+
+    def __init__(self, position: Vector2, game: Union[Game, None] = None) -> None:
         """
         Initializing new entity.
 
+        Entity is added into game world, by default it is Game.get_instance()
+
         When overriding this method need to put 'super().__init__(self, position)' on top of method
         """
-        self.position = position
+        # Copying position, so moving entity in place will not change vector of caller
+        self.position = Vector2(position.x, position.y)
 
         self._on_update = list()
+        self._on_parallel_update = list()
         self._on_destroy = list()
 
         # Registering entity
         self.id = 0
-        self.game = Game.get_instance()
+        self.game = game if game is not None else Game.get_instance()
         self.game.add_entity(self)
         self._enabled = True
 
-    def subscribe_on_update(self, function: Union[FunctionType, MethodType]):
+        _live_entities.add(self)
+
+    def translate(self, x: float, y: float):
+        """
+        Moves entity by x and y.
+
+        Position is changed in place, without creating new Vector2
+        """
+        self.position.move_ip(x, y)
+
+    def subscribe_on_update(self, function: Union[FunctionType, MethodType], parallel_safe=False):
         """
         Subscribes function for updates.
 
         Subscribed function will be called every frame
+
+        If parallel_safe=True, function can be called from thread pool (see Game.set_update_threads)
+        before usual updates of all entities. Such function must change only its own entity,
+        it can return another function, that will be called on main thread after all parallel updates.
         """
-        self._on_update.append(function)
+        if parallel_safe:
+            self._on_parallel_update.append(function)
+        else:
+            self._on_update.append(function)
 
     def subscribe_on_destroy(self, function: Union[FunctionType, MethodType]):
         """
@@ -57,6 +94,19 @@ class Entity:
         for method in self._on_update:
             method(delta_time)
 
+    def _parallel_update(self, delta_time: float) -> List[Callable[[], None]]:
+        """
+        Calls parallel safe update functions.
+
+        Returns functions that were returned by them, to call them on main thread
+        """
+        results = list()
+        for method in self._on_parallel_update:
+            result = method(delta_time)
+            if result is not None:
+                results.append(result)
+        return results
+
     def destroy(self):
         """
         This method will be called on destroy of this entity
@@ -79,6 +129,28 @@ class Entity:
         self.game.disable_entity(self)
         self._enabled = False
 
+    def write_state(self, buffer: bytearray):
+        """
+        Writes state of entity into buffer (used for snapshots).
+
+        Mixins with their own state override this method and call 'super().write_state(buffer)' first
+        """
+        buffer.extend(_ENTITY_STATE.pack(
+            self.position.x, self.position.y, self._enabled))
+
+    def read_state(self, data: memoryview, offset: int) -> int:
+        """
+        Reads state that was written by write_state method.
+
+        Returns offset right after read state.
+
+        Mixins with their own state override this method and call 'offset = super().read_state(data, offset)' first
+        """
+        x, y, is_enabled = _ENTITY_STATE.unpack_from(data, offset)
+        self.position = Vector2(x, y)
+        self.enabled = is_enabled
+        return offset + _ENTITY_STATE.size
+
     @property
     def enabled(self) -> bool:
         return self._enabled
@@ -2,16 +2,23 @@
 Mixins for entities (Based on Entity class)
 """
 from types import FunctionType, MethodType
-from typing import Union, List
+from typing import NamedTuple, Union, List
+import struct
 from ..utils.drawable import BaseSprite
 from ..utils.math import Vector2
-from ..utils.collision_side import check_side, UP, DOWN, RIGHT, LEFT
+from ..utils.collision_side import UP, DOWN, RIGHT, penetration, segment_rect_intersection
+from ..utils.spatial_hash import ALL_CATEGORIES
 from ..game import Game
 
 from .entity import Entity
 
 import pygame
 
+# sprite layer, sprite visibility
+_SPRITE_STATE = struct.Struct("<f?")
+# velocity x, velocity y
+_VELOCITY_STATE = struct.Struct("<ff")
+
 
 class SpriteMixin(Entity):
     """
@@ -24,23 +31,49 @@ class SpriteMixin(Entity):
         """
         Initializating this mixin.
 
-        Automatically adding sprite in game
+        Automatically adding sprite in game.
+
+        Sprite follows entity position, it is moved on drawing (see BaseSprite.attach_to)
         """
-        self.sprite_offset = sprite_position_offset
+        self._sprite_offset = sprite_position_offset
+        self._sprite = None
         self.sprite = sprite
-        self.sprite.center_position = (
-            self.position + self.sprite_offset).get_integer_tuple()
-        self.subscribe_on_update(self.sprite_update_position)
         self.subscribe_on_destroy(self.kill_sprite)
 
-    def sprite_update_position(self, delta_time: float):
+    @property
+    def sprite(self) -> BaseSprite:
         """
-        Runned every frame.
+        Sprite of entity
+        """
+        return self._sprite
+
+    @sprite.setter
+    def sprite(self, new_sprite: BaseSprite):
+        if self._sprite is not None and self._sprite is not new_sprite:
+            self._sprite.detach()
+
+        self._sprite = new_sprite
+        new_sprite.attach_to(self, self._sprite_offset)
 
-        Changing position of sprite.
+    @property
+    def sprite_offset(self) -> Vector2:
+        """
+        Offset of sprite center from entity position
+        """
+        return self._sprite_offset
+
+    @sprite_offset.setter
+    def sprite_offset(self, offset: Vector2):
+        self._sprite_offset = offset
+        self._sprite.attach_to(self, offset)
+
+    def sprite_update_position(self, delta_time=0.0):
         """
-        self.sprite.center_position = (
-            self.position + self.sprite_offset).get_integer_tuple()
+        Moves sprite to position of entity right now.
+
+        Usually it is not needed, position of sprite is updated on drawing.
+        """
+        self._sprite.update_anchor_position()
 
     def kill_sprite(self):
         """
@@ -50,20 +83,63 @@ class SpriteMixin(Entity):
         """
         self.sprite.kill()
 
+    def write_state(self, buffer: bytearray):
+        super().write_state(buffer)
+        buffer.extend(_SPRITE_STATE.pack(
+            self.sprite.layer, self.sprite.visible))
+
+    def read_state(self, data: memoryview, offset: int) -> int:
+        offset = super().read_state(data, offset)
+        layer, is_visible = _SPRITE_STATE.unpack_from(data, offset)
+
+        self.sprite.visible = is_visible
+        if layer != self.sprite.layer:
+            self.sprite.layer = int(layer) if layer.is_integer() else layer
+
+        return offset + _SPRITE_STATE.size
+
 # TODO: Add function to cast with image polygons
 # TODO: Add not rectangle collisions
 # TODO: Separate CollisionMixin entities from all enabled_entities, to iterate on collision check only on entities with collision mixin
 
 
+class RaycastHit(NamedTuple):
+    """
+    Result of CollisionMixin.raycast and CollisionMixin.segment_cast.
+
+    normal is side of collider that was hit, it is Vector2(0, 0) if cast started inside of collider
+    """
+    entity: "CollisionMixin"
+    point: Vector2
+    normal: Vector2
+    distance: float
+
+
 class CollisionMixin(Entity):
     """
     Mixin for collision callbacks
 
     Need to run collision_init method for initialization
+
+    Every collider has category and mask (integer bitfields). Two colliders are checked for collisions only if
+    category of each of them has common bits with mask of another one.
+
+    Colliders are kept in broad phase grid of game, it is updated when position or collider_size is assigned or
+    entity is moved with translate method. If position or collider_size vector is changed in place (position.x = ...),
+    collider is updated on next update of this entity.
+
+    Colliders moved in parallel safe update functions are updated in broad phase on main thread,
+    after all parallel updates are finished.
     """
 
+    # Is collider added into broad phase of game
+    _is_collider_registered = False
+    # Collider was moved in parallel update and is not updated in broad phase yet
+    _is_collider_dirty = False
+
     def collision_init(
-        self, collider_size: Vector2, is_trigger=False, is_check_collision=False
+        self, collider_size: Vector2, is_trigger=False, is_check_collision=False,
+        category=1, mask=ALL_CATEGORIES,
     ):
         """
         Initializing this mixin.
@@ -71,14 +147,97 @@ class CollisionMixin(Entity):
         If is_check_collisions=False subscribed functions on_collide and on_trigger will not be called.
 
         It is used for optimization.
+
+        category - bits of groups that collider belongs to (for example: PLAYER = 1, BULLET = 2, PICKUP = 4)
+
+        mask - bits of groups that collider collides with (for example, pickup with mask=PLAYER collides only with player)
         """
-        self.collider_size: Vector2 = collider_size
+        self._collider_size: Vector2 = collider_size
         self.is_trigger: bool = is_trigger
+        self._collision_category: int = category
+        self.collision_mask: int = mask
         self.subscribe_on_update(self._check_collisions)
         self.is_check_collision: bool = is_check_collision
         self.on_collide_callbacks = list()
         self.on_trigger_callbacks = list()
 
+        # Rects reused in _check_collisions, so checking collisions do not create new rects every frame
+        self._self_collider_rect = pygame.Rect(0, 0, 0, 0)
+        self._other_collider_rect = pygame.Rect(0, 0, 0, 0)
+
+        self._is_collider_registered = True
+        self._sync_collider()
+        self.subscribe_on_destroy(self._unregister_collider)
+
+    @property
+    def position(self) -> Vector2:
+        """
+        Position of entity
+        """
+        return self._position
+
+    @position.setter
+    def position(self, value: Vector2):
+        self._position = value
+        if self._is_collider_registered:
+            self._sync_collider()
+
+    @property
+    def collider_size(self) -> Vector2:
+        """
+        Width and height of collider
+        """
+        return self._collider_size
+
+    @collider_size.setter
+    def collider_size(self, value: Vector2):
+        self._collider_size = value
+        if self._is_collider_registered:
+            self._sync_collider()
+
+    @property
+    def collision_category(self) -> int:
+        """
+        Bits of groups that collider belongs to
+        """
+        return self._collision_category
+
+    @collision_category.setter
+    def collision_category(self, category: int):
+        self._collision_category = category
+        if self._is_collider_registered:
+            self._sync_collider()
+
+    def translate(self, x: float, y: float):
+        super().translate(x, y)
+        if self._is_collider_registered:
+            self._sync_collider()
+
+    def _unregister_collider(self):
+        """
+        Runned on destroy of entity.
+
+        Removes collider from broad phase, so moving destroyed entity does not add it back
+        """
+        self._is_collider_registered = False
+        self.game._colliders.remove(self.id)
+
+    def _sync_collider(self):
+        """
+        Updates cells of this collider in broad phase
+        """
+        # Broad phase is shared by all entities, so it is not changed from thread pool
+        if self.game._is_parallel_updating:
+            self._is_collider_dirty = True
+            return
+        self._is_collider_dirty = False
+
+        size = self._collider_size
+        left = int(self._position.x - size.x / 2)
+        top = int(self._position.y - size.y / 2)
+        self.game._colliders.insert(
+            self.id, self, self._collision_category, left, top, left + int(size.x), top + int(size.y))
+
     def subscribe_on_collide(self, function: Union[FunctionType, MethodType]):
         """
         Subscribes function for collisions.
@@ -86,6 +245,8 @@ class CollisionMixin(Entity):
         Subscribed function will be called every frame when colliding with another collider.
 
         Function will be called with entity argument like that: function(entity: CollisionMixin)
+
+        Rects that passed into function are reused between calls, copy them if you need to keep them.
         """
         self.on_collide_callbacks.append(function)
 
@@ -119,51 +280,197 @@ class CollisionMixin(Entity):
 
         Checks collisions
         """
+        if not self._is_collider_registered:
+            return
+
+        # Position could be changed in place, colliders that do not check collisions are moved too
+        self._sync_collider()
+
         if not self.is_check_collision:
             return
 
-        for entity in CollisionMixin.cast_rect(self.collider_rect):
-            if entity.id == self.id:
+        self_rect = self._write_collider_rect(self._self_collider_rect)
+        other_rect = self._other_collider_rect
+
+        category = self._collision_category
+        for entity in CollisionMixin.cast_rect(self_rect, self.game, self.collision_mask):
+            if entity.id == self.id or not entity.collision_mask & category:
                 continue
 
+            entity._write_collider_rect(other_rect)
+
             if entity.is_trigger or self.is_trigger:
-                self._on_trigger(entity, self.collider_rect,
-                                 entity.collider_rect)
+                self._on_trigger(entity, self_rect, other_rect)
                 continue
-            self._on_collide(entity, self.collider_rect,
-                             entity.collider_rect)
+            self._on_collide(entity, self_rect, other_rect)
+
+    def _write_collider_rect(self, rect: pygame.Rect) -> pygame.Rect:
+        """
+        Writes collider of this entity into existing rect and returns it.
+        """
+        rect.update(
+            int(self._position.x - self.collider_size.x / 2),
+            int(self._position.y - self.collider_size.y / 2),
+            int(self.collider_size.x),
+            int(self.collider_size.y),
+        )
+        return rect
 
     @property
     def collider_rect(self) -> pygame.Rect:
         """
         Returning pygame.Rect of this collider.
         """
-        return pygame.Rect(
-            (self.position - self.collider_size / 2).get_integer_tuple(),
-            self.collider_size.get_integer_tuple(),
-        )
+        return self._write_collider_rect(pygame.Rect(0, 0, 0, 0))
 
     @staticmethod
-    def cast_rect(rect: pygame.Rect) -> List["CollisionMixin"]:
+    def cast_rect(rect: pygame.Rect, game: Union[Game, None] = None, mask=ALL_CATEGORIES) -> List["CollisionMixin"]:
         """
         Casts a rect and returns all collided entities with CollisionMixin
+
+        By default rect is casted in Game.get_instance() world
+
+        Only colliders with category that has common bits with mask are returned
         """
+        if game is None:
+            game = Game.get_instance()
+
+        left, top, right, bottom = rect.left, rect.top, rect.right, rect.bottom
+        if left == right or top == bottom:
+            return []
+
         collided_entities = list()
-        for entity in Game.get_instance().enabled_entities:
-            if not isinstance(entity, CollisionMixin):
+        for entity in game._colliders.query(left, top, right, bottom, mask):
+            if not entity._enabled:
+                continue
+
+            # Same as rect.colliderect(entity.collider_rect), but without creating new rect
+            width = int(entity.collider_size.x)
+            height = int(entity.collider_size.y)
+            if width == 0 or height == 0:
                 continue
 
-            if rect.colliderect(entity.collider_rect):
+            entity_left = int(entity._position.x - entity.collider_size.x / 2)
+            entity_top = int(entity._position.y - entity.collider_size.y / 2)
+
+            if (
+                entity_left < right
+                and entity_left + width > left
+                and entity_top < bottom
+                and entity_top + height > top
+            ):
                 collided_entities.append(entity)
 
         return collided_entities
 
+    @staticmethod
+    def segment_cast(
+        start: Vector2,
+        end: Vector2,
+        first_hit_only=False,
+        include_triggers=True,
+        ignore: Union["CollisionMixin", None] = None,
+        mask=ALL_CATEGORIES,
+        game: Union[Game, None] = None,
+    ) -> List[RaycastHit]:
+        """
+        Casts a segment from start to end and returns hits sorted by distance.
+
+        Only cells of broad phase that are crossed by segment are checked.
+
+        first_hit_only - stop on first hit, returned list will have 1 or 0 hits
+
+        ignore - collider that is skipped (for example, collider of entity that casts)
+
+        mask - only colliders with category that has common bits with mask are hit
+        """
+        if game is None:
+            game = Game.get_instance()
+
+        colliders = game._colliders.hashes(mask)
+        if not colliders:
+            return []
+        x0, y0 = start.x, start.y
+        dx, dy = end.x - x0, end.y - y0
+
+        checked_ids = set()
+        hits = list()
+        nearest_hit = 2.0
+
+        for cell, exit_part in game._colliders.walk_segment(x0, y0, end.x, end.y):
+            for category_colliders in colliders:
+                for entity_id in category_colliders.cell(cell):
+                    if entity_id in checked_ids:
+                        continue
+                    checked_ids.add(entity_id)
+
+                    entity = category_colliders.get(entity_id)
+                    if entity is ignore or not entity._enabled or (entity.is_trigger and not include_triggers):
+                        continue
+
+                    size = entity.collider_size
+                    left = int(entity._position.x - size.x / 2)
+                    top = int(entity._position.y - size.y / 2)
+                    if int(size.x) == 0 or int(size.y) == 0:
+                        continue
+
+                    intersection = segment_rect_intersection(
+                        x0, y0, dx, dy, left, top, left + int(size.x), top + int(size.y))
+                    if intersection is None:
+                        continue
+
+                    hits.append((intersection, entity))
+                    nearest_hit = min(nearest_hit, intersection[0])
+
+            # Hits in next cells can not be nearer than hits inside of checked cells
+            if first_hit_only and nearest_hit <= exit_part:
+                break
+
+        hits.sort(key=lambda hit: (hit[0][0], hit[1].id))
+        if first_hit_only:
+            hits = hits[:1]
+
+        length = (dx * dx + dy * dy) ** 0.5
+        return [
+            RaycastHit(
+                entity,
+                Vector2(x0 + dx * part, y0 + dy * part),
+                Vector2(normal_x, normal_y),
+                length * part,
+            )
+            for (part, normal_x, normal_y), entity in hits
+        ]
+
+    @staticmethod
+    def raycast(
+        origin: Vector2,
+        direction: Vector2,
+        max_distance: float,
+        first_hit_only=False,
+        include_triggers=True,
+        ignore: Union["CollisionMixin", None] = None,
+        mask=ALL_CATEGORIES,
+        game: Union[Game, None] = None,
+    ) -> List[RaycastHit]:
+        """
+        Casts a ray from origin in direction up to max_distance.
+
+        Same as segment_cast
+        """
+        direction = direction.normalized()
+        end = Vector2(origin.x + direction.x * max_distance,
+                      origin.y + direction.y * max_distance)
+        return CollisionMixin.segment_cast(origin, end, first_hit_only, include_triggers, ignore, mask, game)
+
 
 class VelocityMixin(Entity):
     """
     Mixin for smooth moving of entity
 
     Change self.velocity for moving
+
+    Velocity is in pixels per frame. If update covers few frames (see Entity.degradable_updates),
+    entity is moved by velocity of all of them
     """
 
     def velocity_init(self, is_kinematic=True, velocity_regress_strength=0.0):
@@ -179,19 +486,42 @@ class VelocityMixin(Entity):
 
         self.subscribe_on_update(self._update_velocity_and_pos)
 
-    def _update_velocity_and_pos(self, _):
+    def _update_velocity_and_pos(self, delta_time: float):
         """
         Called every frame.
 
         Changing position of entity
         """
-        self.position += self.velocity
+        # Count of frames covered by this update, it is more than 1 when updates were skipped
+        frame_time = self.game.delta_time
+        frames = delta_time / frame_time if frame_time > 0 else 1.0
+
+        strength = self.velocity_regress_strength
+        if frames == 1:
+            self.position += self.velocity
+        elif self.is_kinematic or not 0 < strength <= 1:
+            self.position += self.velocity * frames
+        else:
+            # The same distance and slowing down, as with update every frame
+            remaining = (1 - strength) ** frames
+            self.position += self.velocity * ((1 - remaining) / strength)
+            strength = 1 - remaining
 
         if not self.is_kinematic:
             self.velocity = Vector2.lerp(
-                self.velocity, Vector2(0, 0), self.velocity_regress_strength
+                self.velocity, Vector2(0, 0), strength
             )
 
+    def write_state(self, buffer: bytearray):
+        super().write_state(buffer)
+        buffer.extend(_VELOCITY_STATE.pack(self.velocity.x, self.velocity.y))
+
+    def read_state(self, data: memoryview, offset: int) -> int:
+        offset = super().read_state(data, offset)
+        x, y = _VELOCITY_STATE.unpack_from(data, offset)
+        self.velocity = Vector2(x, y)
+        return offset + _VELOCITY_STATE.size
+
 
 class BlockingCollisionMixin(CollisionMixin):
     """
@@ -200,8 +530,8 @@ class BlockingCollisionMixin(CollisionMixin):
     Based on CollisiongMixin
     """
 
-    def collision_init(self, collider_size: Vector2, is_trigger=False):
-        super().collision_init(collider_size, is_trigger, True)
+    def collision_init(self, collider_size: Vector2, is_trigger=False, category=1, mask=ALL_CATEGORIES):
+        super().collision_init(collider_size, is_trigger, True, category, mask)
         self.subscribe_on_collide(self._move_back_on_colliding)
 
     def _move_back_on_colliding(self, _, self_collider: pygame.Rect, other_collider: pygame.Rect):
@@ -209,21 +539,30 @@ class BlockingCollisionMixin(CollisionMixin):
         Runned every frame.
 
         Moving back entity from another collider.
+
+        Position and self_collider are changed in place.
+        Entity is placed right on the side of another collider, so it is pushed out in one frame
         """
-        side = check_side(self_collider, other_collider)
+        side, depth = penetration(
+            self_collider.x, self_collider.y, self_collider.width, self_collider.height,
+            other_collider.x, other_collider.y, other_collider.width, other_collider.height,
+        )
+
+        if depth == 0:
+            return
 
+        position = self._position
         if side == UP:
-            self_new_y = other_collider.top - (self_collider.height / 2)
-            self.position = Vector2(self.position.x, self_new_y)
+            position.y = other_collider.top - self.collider_size.y / 2
         elif side == DOWN:
-            self_new_y = other_collider.bottom + (self_collider.height / 2)
-            self.position = Vector2(self.position.x, self_new_y)
+            position.y = other_collider.bottom + self.collider_size.y / 2
         elif side == RIGHT:
-            self_new_x = other_collider.right + (self_collider.width / 2)
-            self.position = Vector2(self_new_x, self.position.y)
+            position.x = other_collider.right + self.collider_size.x / 2
         else:
-            self_new_x = other_collider.left - (self_collider.width / 2)
-            self.position = Vector2(self_new_x, self.position.y)
+            position.x = other_collider.left - self.collider_size.x / 2
+
+        self._sync_collider()
+        self._write_collider_rect(self_collider)
 
 
 class MouseEventMixin(CollisionMixin):
@@ -246,6 +585,7 @@ class MouseEventMixin(CollisionMixin):
             self._mouse_events, pygame.MOUSEBUTTONDOWN)
         self.game.subsribe_for_event(self._mouse_events, pygame.MOUSEBUTTONUP)
         self.game.subsribe_for_event(self._mouse_events, pygame.MOUSEMOTION)
+        self.subscribe_on_destroy(self._unsubscribe_mouse_events)
 
     def subscribe_on_mouse_down(self, function: Union[MethodType, FunctionType]):
         """
@@ -277,11 +617,13 @@ class MouseEventMixin(CollisionMixin):
 
         Calling subscribed functions
         """
-        # Checking, is mouse pointer is over object
-        mouse_world_position = self.game.from_screen_to_world_point(
-            Vector2.from_tuple(pygame.mouse.get_pos()))
+        # Checking, is mouse pointer is over object.
+        # Position is taken from event, so recorded events are replayed the same way
+        camera_position = self.game._camera_position
+        mouse_x = event.pos[0] + camera_position.x
+        mouse_y = event.pos[1] + camera_position.y
 
-        if not self.collider_rect.collidepoint(mouse_world_position.get_tuple()):
+        if not self._write_collider_rect(self._self_collider_rect).collidepoint(mouse_x, mouse_y):
             return
 
         if event.type == pygame.MOUSEBUTTONDOWN:
@@ -290,3 +632,9 @@ class MouseEventMixin(CollisionMixin):
             [f(event.button) for f in self._on_mouse_up]
         elif event.type == pygame.MOUSEMOTION:
             [f() for f in self._on_mouse_motion]
+
+    def _unsubscribe_mouse_events(self):
+        """
+        Runned on destroy of entity.
+        """
+        self.game.unsubscribe_from_event(self._mouse_events)
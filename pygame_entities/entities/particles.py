@@ -0,0 +1,204 @@
+"""
+Particle system.
+
+Particles are not entities or sprites, they are stored in flat arrays of one emitter entity.
+"""
+from array import array
+from math import cos, sin, pi
+from random import random
+from typing import Dict, List, Tuple, Union
+
+from ..game import Game
+from ..utils.math import Vector2
+from .entity import Entity
+
+import pygame
+
+
+class ParticleEmitter(Entity):
+    """
+    Entity that emits, updates and draws particles.
+
+    Position, velocity, lifetime and color of particles are kept in arrays, all particles are updated
+    in one update function and drawn with one Surface.blits call.
+
+    Positions are in world, camera position of game is subtracted on drawing.
+    Velocity and gravity are in pixels per second.
+    """
+
+    def __init__(
+        self,
+        position: Vector2,
+        max_particles=5000,
+        particle_size=2,
+        gravity=Vector2(0, 0),
+        drag=0.0,
+        layer=0,
+        game: Union[Game, None] = None,
+    ) -> None:
+        """
+        max_particles - particles emitted above this count are skipped
+
+        drag - part of velocity that is lost every second (0 <= drag <= 1)
+
+        layer - layer of drawing particles (see Game.subscribe_on_draw)
+        """
+        super().__init__(position, game)
+
+        self.max_particles = max_particles
+        self.particle_size = particle_size
+        self.gravity = gravity
+        self.drag = drag
+
+        self._x = array("f")
+        self._y = array("f")
+        self._velocity_x = array("f")
+        self._velocity_y = array("f")
+        self._lifetime = array("f")
+        self._color = array("H")
+
+        # One surface for every color of particles
+        self._colors: Dict[Tuple[int, ...], int] = dict()
+        self._color_surfaces: List[pygame.Surface] = list()
+
+        self.subscribe_on_update(self._update_particles)
+        self.game.subscribe_on_draw(self._draw_particles, layer)
+        self.subscribe_on_destroy(self._unsubscribe_drawing)
+
+    @property
+    def particles_count(self) -> int:
+        """
+        Count of alive particles
+        """
+        return len(self._x)
+
+    def _get_color_index(self, color: Tuple[int, ...]) -> int:
+        color = tuple(color)
+        index = self._colors.get(color)
+
+        if index is None:
+            index = len(self._color_surfaces)
+            surface = pygame.Surface(
+                (self.particle_size, self.particle_size), pygame.SRCALPHA)
+            surface.fill(color)
+            self._color_surfaces.append(surface)
+            self._colors[color] = index
+
+        return index
+
+    def emit(
+        self,
+        count: int,
+        speed: float,
+        lifetime: float,
+        color: Tuple[int, ...],
+        direction=0.0,
+        spread=2 * pi,
+        speed_variation=0.0,
+    ):
+        """
+        Emits particles from position of emitter.
+
+        direction - angle of emitting in radians
+
+        spread - angle in radians, in which particles are randomly emitted around direction
+
+        speed_variation - particle speed is randomly changed by up to this part of speed
+
+        Count of particles is limited by max_particles, scaled by game.particles_limit_scale
+        """
+        max_particles = int(self.max_particles * self.game.particles_limit_scale)
+        count = min(count, max_particles - len(self._x))
+        if count <= 0:
+            return
+
+        color_index = self._get_color_index(color)
+        x = self.position.x
+        y = self.position.y
+
+        for _ in range(count):
+            angle = direction + (random() - 0.5) * spread
+            particle_speed = speed * (1 + (random() * 2 - 1) * speed_variation)
+
+            self._x.append(x)
+            self._y.append(y)
+            self._velocity_x.append(cos(angle) * particle_speed)
+            self._velocity_y.append(sin(angle) * particle_speed)
+            self._lifetime.append(lifetime)
+            self._color.append(color_index)
+
+    def clear(self):
+        """
+        Removes all particles
+        """
+        for values in (self._x, self._y, self._velocity_x, self._velocity_y, self._lifetime, self._color):
+            del values[:]
+
+    def _remove_particle(self, index: int):
+        """
+        Removes particle by moving last particle on its place
+        """
+        for values in (self._x, self._y, self._velocity_x, self._velocity_y, self._lifetime, self._color):
+            last = values.pop()
+            if index < len(values):
+                values[index] = last
+
+    def _update_particles(self, delta_time: float):
+        """
+        Runned every frame.
+
+        Moves all particles and removes dead particles
+        """
+        xs, ys = self._x, self._y
+        velocities_x, velocities_y = self._velocity_x, self._velocity_y
+        lifetimes = self._lifetime
+
+        gravity_x = self.gravity.x * delta_time
+        gravity_y = self.gravity.y * delta_time
+        damping = max(1 - self.drag * delta_time, 0)
+
+        i = 0
+        while i < len(xs):
+            lifetime = lifetimes[i] - delta_time
+            if lifetime <= 0:
+                self._remove_particle(i)
+                continue
+
+            lifetimes[i] = lifetime
+            velocity_x = (velocities_x[i] + gravity_x) * damping
+            velocity_y = (velocities_y[i] + gravity_y) * damping
+            velocities_x[i] = velocity_x
+            velocities_y[i] = velocity_y
+            xs[i] += velocity_x * delta_time
+            ys[i] += velocity_y * delta_time
+            i += 1
+
+    def _draw_particles(self, surface: pygame.Surface):
+        """
+        Runned every frame.
+
+        Draws all particles with one call
+        """
+        if not self._x:
+            return
+
+        camera_x = self.game._camera_position.x
+        camera_y = self.game._camera_position.y
+        color_surfaces = self._color_surfaces
+
+        blit_sequence = [
+            (color_surfaces[color], (int(x - camera_x), int(y - camera_y)))
+            for x, y, color in zip(self._x, self._y, self._color)
+        ]
+
+        fblits = getattr(surface, "fblits", None)
+        if fblits is not None:
+            fblits(blit_sequence)
+        else:
+            surface.blits(blit_sequence, doreturn=False)
+
+    def _unsubscribe_drawing(self):
+        """
+        Runned on destroy of entity.
+        """
+        self.game.unsubscribe_from_draw(self._draw_particles)
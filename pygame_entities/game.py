@@ -4,15 +4,35 @@ Main Game class.
 Needs to be in every game builded with this pygame_entities library
 """
 
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from time import perf_counter
 from types import FunctionType, MethodType
-from typing import Dict, List, Tuple, Union, TYPE_CHECKING
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple, Union, TYPE_CHECKING
 if TYPE_CHECKING:
     from .entities.entity import Entity
     from .utils.drawable import BaseSprite
+    from .replay import EventRecorder
 from .utils.math import Vector2
+from .utils.render_group import RenderGroup
+from .utils.spatial_hash import CategorizedSpatialHash
 
 import pygame
 
+# Size of cells in broad phase of collisions (in pixels)
+COLLISION_CELL_SIZE = 64
+
+# Entity class -> classes from its MRO, by which entity is indexed (see Game.query)
+_index_types_cache: Dict[type, Tuple[type, ...]] = dict()
+
+
+def _index_types(entity_type: type) -> Tuple[type, ...]:
+    index_types = _index_types_cache.get(entity_type)
+    if index_types is None:
+        index_types = _index_types_cache[entity_type] = tuple(
+            cls for cls in entity_type.__mro__ if cls is not object)
+    return index_types
+
 
 class Game:
     """
@@ -22,21 +42,32 @@ class Game:
 
     To create/get Game object use Game.get_instance method.
 
+    Additional independent worlds (for example for headless simulations) are created with Game.create_world method.
+
     Do not use initialization.
     """
 
     _instance = None
 
-    def get_instance(screen_resolution=(0, 0), frame_rate=60, void_color=(0, 0, 0)) -> "Game":
+    def get_instance(screen_resolution=(0, 0), frame_rate=60, void_color=(0, 0, 0), headless=False, lazy_init=False) -> "Game":
         """
         Get instance of Game class.
+
+        If headless=True, game will not open a window and will render into plain pygame.Surface.
+
+        If lazy_init=True, pygame.init() is not called. Display is initialized only when screen is needed
+        first time (on screen property access or on run), headless game never initializes it.
+        Other pygame modules (mixer, joystick, etc) need to be initialized by you,
+        font module is initialized by FontSprite and load_font.
+        Without lazy_init all pygame modules are initialized with pygame.init() and window is opened immediately.
         """
         if Game._instance is None:
-            Game._instance = Game(screen_resolution, frame_rate, void_color)
+            Game._instance = Game(
+                screen_resolution, frame_rate, void_color, headless, lazy_init)
 
         return Game._instance
 
-    def __init__(self, screen_resolution=(0, 0), frame_rate=60, void_color=(0, 0, 0)) -> None:
+    def __init__(self, screen_resolution=(0, 0), frame_rate=60, void_color=(0, 0, 0), headless=False, lazy_init=False) -> None:
         """
         Do not use this.
 
@@ -45,18 +76,63 @@ class Game:
         if not Game._instance is None:
             raise Exception("Game class instantiated 2 times.")
 
-        pygame.init()
+        self._init_world(screen_resolution, frame_rate,
+                         void_color, headless, lazy_init)
+
+    @staticmethod
+    def create_world(screen_resolution=(0, 0), frame_rate=60, void_color=(0, 0, 0), headless=True) -> "Game":
+        """
+        Creates new game world, independent from Game.get_instance() and other worlds.
+
+        Entities and sprites are added into world that is passed to them with game argument,
+        or into world that is activated with Game.activate method.
+
+        Only one world in process can have a window, so worlds are headless by default.
+        Worlds are initialized lazily (see lazy_init of Game.get_instance)
+        """
+        world = Game.__new__(Game)
+        world._init_world(screen_resolution, frame_rate,
+                          void_color, headless, lazy_init=True)
+        return world
+
+    @contextmanager
+    def activate(self):
+        """
+        Context manager, that makes Game.get_instance() return this world inside of with block.
+
+        Entities and sprites created inside with block are added into this world
+        """
+        previous_instance = Game._instance
+        Game._instance = self
+        try:
+            yield self
+        finally:
+            Game._instance = previous_instance
+
+    def _init_world(self, screen_resolution, frame_rate, void_color, headless, lazy_init):
+        """
+        Initializing fields of game world
+        """
+        if not lazy_init:
+            pygame.init()
 
         # Public fields
         self.framerate: int = frame_rate
         self.void_color: Tuple[int, int, int] = void_color
         self.delta_time = 1 / self.framerate
+        # Sum of delta times of all frames
+        self.time = 0.0
 
+        self.headless: bool = headless
         self._screen_resolution: Tuple[int, int] = screen_resolution
-        self._screen = pygame.display.set_mode(self._screen_resolution)
+        self._screen: Union[pygame.Surface, None] = None
+        if headless:
+            self._screen = pygame.Surface(self._screen_resolution)
+        elif not lazy_init:
+            self._screen = pygame.display.set_mode(self._screen_resolution)
         self._clock = pygame.time.Clock()
         self.running = True
-        self._sprites = pygame.sprite.LayeredUpdates()
+        self._sprites = RenderGroup()
 
         # Using dict, because with dict we can remove entities from game in O(1) time
         self._entity_counter = 0
@@ -64,13 +140,51 @@ class Game:
         self._enabled_entities = dict()
         self._disabled_entities = dict()
 
+        # Indexes of enabled entities by every class of their MRO: class -> {id: entity}.
+        # Version of class is incremented on every change of its index
+        self._type_index: Dict[type, Dict[int, "Entity"]] = dict()
+        self._type_versions: Dict[type, int] = dict()
+        # Cached results of queries with few types: types -> (versions of types, {id: entity})
+        self._query_cache: Dict[Tuple[type, ...], Tuple[Tuple[int, ...], Dict[int, "Entity"]]] = dict()
+
         # For camera
         self.camera_follow_smooth_coefficient = 0.1
         self._camera_position = Vector2(0, 0)
         self._camera_follow_object = None
 
+        # Fixed timestep (see set_fixed_timestep)
+        self.fixed_timestep: Union[float, None] = None
+        self.max_fixed_steps = 5
+        self.interpolation_alpha = 1.0
+        self._time_accumulator = 0.0
+
+        # Seconds spent on phases of last frame (see step method)
+        self.phase_times: Dict[str, float] = {
+            "events": 0.0, "update": 0.0, "sprites": 0.0, "draw": 0.0}
+        self.frame_cost = 0.0
+
+        # Quality settings, lowered by FrameGovernor when frames are too slow.
+        # Entities with degradable_updates=True are updated once in degraded_update_interval updates
+        self.degraded_update_interval = 1
+        # Part of max_particles of ParticleEmitter that can be emitted
+        self.particles_limit_scale = 1.0
+        self._updates_count = 0
+
+        # for parallel safe updates
+        self._update_threads_count = 1
+        self._update_executor: Union[ThreadPoolExecutor, None] = None
+        # True while parallel safe functions are called, shared state must not be changed then
+        self._is_parallel_updating = False
+
+        # Broad phase of collisions, filled by CollisionMixin entities (separated by collision categories)
+        self._colliders = CategorizedSpatialHash(COLLISION_CELL_SIZE)
+
+        # for drawing without sprites: sorted list of (layer, function)
+        self._draw_callbacks: List[Tuple[Union[int, float], Callable[[pygame.Surface], None]]] = list()
+
         # for event system
         self._subscribed_events: Dict[int, List[FunctionType]] = dict()
+        self._event_recorder: Union["EventRecorder", None] = None
 
     @property
     def screen(self) -> pygame.Surface:
@@ -78,7 +192,11 @@ class Game:
         Screen surface.
 
         Can be changed to another pygame.Surface object.
+
+        With lazy_init window is opened on first access
         """
+        if self._screen is None:
+            self._open_window()
         return self._screen
 
     @screen.setter
@@ -86,6 +204,27 @@ class Game:
         self._screen = value
         self._screen_resolution = value.get_size()
 
+    def _open_window(self):
+        """
+        Initializing pygame display and opening window
+        """
+        if not pygame.display.get_init():
+            pygame.display.init()
+        self.screen = pygame.display.set_mode(self._screen_resolution)
+
+    @property
+    def animation_update_interval(self) -> int:
+        """
+        Sprites with skippable_update=True (like AnimatedSprite) are updated once in this count of frames.
+
+        Lowered by FrameGovernor when frames are too slow
+        """
+        return self._sprites.skippable_update_interval
+
+    @animation_update_interval.setter
+    def animation_update_interval(self, interval: int):
+        self._sprites.skippable_update_interval = max(interval, 1)
+
     @property
     def screen_resolution(self) -> Tuple[int, int]:
         """
@@ -121,11 +260,11 @@ class Game:
         """
         self._sprites.change_layer(sprite, layer)
 
-    def _update_events(self):
+    def _update_events(self, events: Sequence[pygame.event.Event]):
         """
-        Gets all pygame events and calling subscribers of each event type that returned.
+        Calling subscribers of each event type for passed events.
         """
-        for event in pygame.event.get():
+        for event in events:
             for func in self._subscribed_events.get(event.type, []):
                 func(event)
 
@@ -139,33 +278,258 @@ class Game:
         subscribers.append(function)
         self._subscribed_events[event_type] = subscribers
 
+    def unsubscribe_from_event(self, function: Union[MethodType, FunctionType], event_type: Union[int, None] = None):
+        """
+        Unsubscribes function that was subscribed with subsribe_for_event.
+
+        If event_type is None, function is unsubscribed from all events.
+        Subscribers that hold entities need to be unsubscribed on destroy, or entities will stay in memory
+        """
+        event_types = list(self._subscribed_events) if event_type is None else [event_type]
+
+        for subscribed_type in event_types:
+            subscribers = [
+                subscriber for subscriber in self._subscribed_events.get(subscribed_type, ())
+                if subscriber != function
+            ]
+            if subscribers:
+                self._subscribed_events[subscribed_type] = subscribers
+            else:
+                self._subscribed_events.pop(subscribed_type, None)
+
     def run(self):
         """
         Starts main loop of game.
 
         All configurations need to be created before calling this method
         """
+        if self._screen is None:
+            self._open_window()
+        elif not pygame.display.get_init():
+            # Events are polled from display, even in headless game
+            pygame.display.init()
+
         while self.running:
-            self._screen.fill(self.void_color)
+            events = pygame.event.get()
+            if self._event_recorder is not None:
+                self._event_recorder.record_frame(self.delta_time, events)
+
+            self.step(events, self.delta_time)
 
-            # Updating systems
-            self._update_events()
+            if not self.headless:
+                pygame.display.flip()
+            self.delta_time = self._clock.tick(self.framerate) / 1000
+
+    def step(self, events: Sequence[pygame.event.Event], delta_time: float):
+        """
+        Runs one frame of game with passed events and delta time.
+
+        Used by run method, and can be called directly for headless simulations and replays.
+
+        Time of every phase is saved into phase_times, and time of whole frame into frame_cost
+        """
+        start_time = perf_counter()
+        phase_times = self.phase_times
+
+        self.delta_time = delta_time
+        self.time += delta_time
+        screen = self.screen
+        screen.fill(self.void_color)
+
+        # Updating systems
+        self._update_events(events)
+        events_time = perf_counter()
+        phase_times["events"] = events_time - start_time
+
+        if self.fixed_timestep is None:
             self._update_entities()
-            self._sprites.update()
             self._delete_entities()
-            self._camera_follow()
+        else:
+            self._run_fixed_steps(delta_time)
+        update_time = perf_counter()
+        phase_times["update"] = update_time - events_time
 
-            self._sprites.draw(self._screen)
-            pygame.display.flip()
-            self.delta_time = self._clock.tick(self.framerate) / 1000
+        self._sprites.update()
+        self._camera_follow()
+        sprites_time = perf_counter()
+        phase_times["sprites"] = sprites_time - update_time
+
+        self._sprites.draw(
+            screen, self._draw_callbacks, self._camera_position.get_integer_tuple(),
+            None if self.fixed_timestep is None else self.interpolation_alpha)
+        end_time = perf_counter()
+        phase_times["draw"] = end_time - sprites_time
+
+        self.frame_cost = end_time - start_time
+
+    def set_fixed_timestep(self, timestep: Union[float, None], max_steps=5):
+        """
+        Makes entities update with constant delta time (in seconds), independent from frame rate.
+
+        Time of frames is accumulated, and entities are updated as many times as timestep fits into it
+        (but not more than max_steps times per frame, the rest of time is dropped).
+        Sprites attached to entities are drawn between their positions of last two updates,
+        part of timestep that is left in accumulator is saved in interpolation_alpha.
+
+        Sprites and events are still updated once per frame. Pass None to update entities once per frame
+        """
+        self.fixed_timestep = timestep
+        self.max_fixed_steps = max_steps
+        self.interpolation_alpha = 1.0
+        self._time_accumulator = 0.0
+
+    def _run_fixed_steps(self, delta_time: float):
+        """
+        Updates entities with fixed timestep for time of frame
+        """
+        timestep = self.fixed_timestep
+        self._time_accumulator += delta_time
+        steps = 0
+
+        while self._time_accumulator >= timestep and steps < self.max_fixed_steps:
+            self._sprites.save_anchor_positions()
+            self.delta_time = timestep
+            self._update_entities()
+            self._delete_entities()
+            self._time_accumulator -= timestep
+            steps += 1
+
+        if self._time_accumulator >= timestep:
+            # Game can't keep up, this time is not simulated
+            self._time_accumulator %= timestep
+
+        self.interpolation_alpha = self._time_accumulator / timestep
+        self.delta_time = delta_time
+
+    def subscribe_on_draw(self, function: Callable[[pygame.Surface], None], layer: Union[int, float] = 0):
+        """
+        Subscribes function for drawing on screen.
+
+        Function will be called every frame, like that: function(screen),
+        after sprites with the same or lower layer are drawn
+        """
+        self._draw_callbacks.append((layer, function))
+        self._draw_callbacks.sort(key=lambda callback: callback[0])
+
+    def unsubscribe_from_draw(self, function: Callable[[pygame.Surface], None]):
+        """
+        Unsubscribes function that was subscribed with subscribe_on_draw
+        """
+        self._draw_callbacks = [
+            callback for callback in self._draw_callbacks if callback[1] != function
+        ]
+
+    def set_event_recorder(self, recorder: Union["EventRecorder", None]):
+        """
+        Sets recorder for events and delta time of every frame in run method.
+
+        Pass None to stop recording
+        """
+        self._event_recorder = recorder
+
+    def set_update_threads(self, threads_count: int):
+        """
+        Sets count of threads for parallel safe update functions (see Entity.subscribe_on_update).
+
+        If threads_count <= 1, parallel safe functions are called on main thread
+        """
+        if self._update_executor is not None:
+            self._update_executor.shutdown()
+            self._update_executor = None
+
+        self._update_threads_count = max(threads_count, 1)
+        if self._update_threads_count > 1:
+            self._update_executor = ThreadPoolExecutor(
+                self._update_threads_count)
 
     def _update_entities(self):
         """
         Updates all enabled entities
 
+        Parallel safe update functions are called first, in batches on thread pool.
+        After all of them are finished, functions returned by them are called in order of entities.
+        Then usual update functions are called.
+
+        If degraded_update_interval > 1, parallel safe and usual update functions of entities
+        with degradable_updates=True are called once in that count of updates, with sum of skipped delta times.
+        Entities are spread between updates by their ids.
+        """
+        delta_time = self.delta_time
+        interval = self.degraded_update_interval
+        self._updates_count += 1
+        updates_count = self._updates_count
+
+        parallel_entities = [
+            entity for entity in self.enabled_entities
+            if entity._on_parallel_update and not (
+                interval > 1 and entity.degradable_updates and (updates_count + entity.id) % interval)
+        ]
+        if parallel_entities:
+            self._is_parallel_updating = True
+            try:
+                applies = self._run_parallel_updates(parallel_entities)
+            finally:
+                self._is_parallel_updating = False
+
+            # Colliders moved in parallel updates are updated in broad phase on main thread
+            for entity in parallel_entities:
+                if getattr(entity, "_is_collider_dirty", False):
+                    entity._sync_collider()
+
+            for apply in applies:
+                apply()
+
+        # Copy, because entities can be created, enabled or disabled in updates.
+        # New entities are updated from next frame
+        entities = list(self._enabled_entities.values())
+
+        if interval <= 1:
+            for entity in entities:
+                if entity._skipped_delta_time:
+                    entity._update(delta_time + entity._skipped_delta_time)
+                    entity._skipped_delta_time = 0.0
+                else:
+                    entity._update(delta_time)
+            return
+
+        for entity in entities:
+            if not entity.degradable_updates:
+                entity._update(delta_time)
+            elif (updates_count + entity.id) % interval:
+                entity._skipped_delta_time += delta_time
+            else:
+                entity._update(delta_time + entity._skipped_delta_time)
+                entity._skipped_delta_time = 0.0
+
+    def _run_parallel_updates(self, entities: List["Entity"]) -> List[Callable[[], None]]:
         """
-        for entity in self.enabled_entities:
-            entity._update(self.delta_time)
+        Calls parallel safe update functions of entities and waits for all of them.
+
+        Returns functions returned by update functions, in order of entities
+        """
+        if self._update_executor is None:
+            return Game._update_batch(entities, self.delta_time)
+
+        batch_size = -(-len(entities) // self._update_threads_count)
+        futures = [
+            self._update_executor.submit(
+                Game._update_batch, entities[i:i + batch_size], self.delta_time)
+            for i in range(0, len(entities), batch_size)
+        ]
+
+        results = list()
+        for future in futures:
+            results.extend(future.result())
+        return results
+
+    @staticmethod
+    def _update_batch(entities: List["Entity"], delta_time: float) -> List[Callable[[], None]]:
+        # Skipped delta time is reset after usual updates of entity
+        results = list()
+        for entity in entities:
+            results.extend(entity._parallel_update(
+                delta_time + entity._skipped_delta_time))
+        return results
 
     def _camera_follow(self):
         """
@@ -178,8 +542,8 @@ class Game:
                 self._camera_position,
                 self._camera_follow_object.position
                 - Vector2(
-                    self._screen.get_width() /
-                    2, self._screen.get_height() / 2
+                    self.screen.get_width() /
+                    2, self.screen.get_height() / 2
                 ),
                 self.camera_follow_smooth_coefficient,
             )
@@ -207,6 +571,74 @@ class Game:
         self._enabled_entities[self._entity_counter] = entity
         entity.id = self._entity_counter
         self._entity_counter += 1
+        self._index_entity(entity)
+
+    def _index_entity(self, entity: "Entity"):
+        type_index = self._type_index
+        versions = self._type_versions
+        for cls in _index_types(type(entity)):
+            entities = type_index.get(cls)
+            if entities is None:
+                entities = type_index[cls] = dict()
+            entities[entity.id] = entity
+            versions[cls] = versions.get(cls, 0) + 1
+
+    def _unindex_entity(self, entity: "Entity"):
+        type_index = self._type_index
+        versions = self._type_versions
+        for cls in _index_types(type(entity)):
+            del type_index[cls][entity.id]
+            versions[cls] += 1
+
+    def query(self, *types: type) -> Iterable["Entity"]:
+        """
+        Returns enabled entities, that are instances of all passed classes (entity classes or mixins).
+        Entities are in the same order as in enabled_entities.
+
+        Indexes of entities by classes are kept up to date on adding, enabling, disabling and deleting entities,
+        so query with one class takes O(1) time. Result of query with few classes is cached
+        until entities of these classes are changed.
+
+        Returned view must not be changed, and game entities must not be added or removed while iterating it
+        (copy it with list() for that)
+        """
+        if len(types) == 1:
+            entities = self._type_index.get(types[0])
+            return entities.values() if entities is not None else ()
+
+        if not types:
+            return self.enabled_entities
+
+        versions = tuple(self._type_versions.get(cls, 0) for cls in types)
+        cached = self._query_cache.get(types)
+        if cached is not None and cached[0] == versions:
+            return cached[1].values()
+
+        indexes = [self._type_index.get(cls) for cls in types]
+        if any(index is None for index in indexes):
+            entities = dict()
+        else:
+            # Entities are added into indexes in the same order as into enabled entities
+            indexes.sort(key=len)
+            smallest, others = indexes[0], indexes[1:]
+            entities = {
+                entity_id: entity for entity_id, entity in smallest.items()
+                if all(entity_id in other for other in others)
+            }
+
+        self._query_cache[types] = (versions, entities)
+        return entities.values()
+
+    def get_entity(self, entity_id: int) -> Union["Entity", None]:
+        """
+        Returns enabled or disabled entity by id.
+
+        If there is no entity with this id, returns None
+        """
+        entity = self._enabled_entities.get(entity_id)
+        if entity is None:
+            entity = self._disabled_entities.get(entity_id)
+        return entity
 
     def disable_entity(self, entity):
         """
@@ -217,6 +649,7 @@ class Game:
         if entity.id in self._enabled_entities.keys():
             self._disabled_entities[entity.id] = self._enabled_entities[entity.id]
             del self._enabled_entities[entity.id]
+            self._unindex_entity(entity)
 
     def enable_entity(self, entity):
         """
@@ -227,6 +660,7 @@ class Game:
         if entity.id in self._disabled_entities.keys():
             self._enabled_entities[entity.id] = self._disabled_entities[entity.id]
             del self._disabled_entities[entity.id]
+            self._index_entity(entity)
 
     def delete_entity(self, entity_id: int):
         """
@@ -240,8 +674,10 @@ class Game:
         Deleting all entities that in delete pool
         """
         for entity_id in self._entities_for_delete:
+            self._colliders.remove(entity_id)
+
             if entity_id in self._enabled_entities.keys():
-                del self._enabled_entities[entity_id]
+                self._unindex_entity(self._enabled_entities.pop(entity_id))
             else:
                 del self._disabled_entities[entity_id]
 
@@ -0,0 +1,139 @@
+"""
+Keeping frames in time budget.
+
+FrameGovernor watches cost of frames (see Game.frame_cost and Game.phase_times)
+and lowers quality settings of game when frames are too slow, and raises them back when there is free time.
+"""
+
+from typing import NamedTuple, Sequence, Union
+
+from .game import Game
+from .entities.entity import Entity
+from .utils.math import Vector2
+
+
+class QualityLevel(NamedTuple):
+    """
+    Quality settings of game (see fields with the same names in Game)
+    """
+
+    degraded_update_interval: int
+    particles_limit_scale: float
+    animation_update_interval: int
+
+
+# From best to worst
+DEFAULT_QUALITY_LEVELS = (
+    QualityLevel(1, 1.0, 1),
+    QualityLevel(2, 0.5, 1),
+    QualityLevel(3, 0.25, 2),
+    QualityLevel(4, 0.1, 4),
+)
+
+
+class FrameGovernor(Entity):
+    """
+    Entity that changes quality level of game by cost of frames.
+
+    Average cost of last frames is used as prediction for next frame.
+    If it is over budget for degrade_after frames in a row, quality is lowered by one level.
+    If it is lower than restore_ratio of budget for restore_after frames in a row, quality is raised by one level.
+    Levels are changed one by one, so degradation is predictable: first updates of entities with
+    degradable_updates=True become less often, then particles are limited, then animations skip frames.
+    """
+
+    def __init__(
+        self,
+        frame_budget: Union[float, None] = None,
+        quality_levels: Sequence[QualityLevel] = DEFAULT_QUALITY_LEVELS,
+        degrade_after=3,
+        restore_after=60,
+        restore_ratio=0.6,
+        smoothing=0.2,
+        game: Union[Game, None] = None,
+    ) -> None:
+        """
+        frame_budget - seconds for work of one frame, by default 1 / game.framerate
+
+        smoothing - weight of last frame in average cost of frames (0 < smoothing <= 1)
+        """
+        super().__init__(Vector2(0, 0), game)
+
+        self.frame_budget = frame_budget if frame_budget is not None else 1 / self.game.framerate
+        self.quality_levels = quality_levels
+        self.degrade_after = degrade_after
+        self.restore_after = restore_after
+        self.restore_ratio = restore_ratio
+        self.smoothing = smoothing
+
+        self.average_cost = 0.0
+        self._checked_time = self.game.time
+        self._level = 0
+        self._slow_frames = 0
+        self._fast_frames = 0
+        self._is_destroyed = False
+
+        self._apply_level()
+        self.subscribe_on_update(self._check_frame_cost)
+        self.subscribe_on_destroy(self._restore_quality)
+
+    @property
+    def level(self) -> int:
+        """
+        Index of current quality level, 0 is best quality
+        """
+        return self._level
+
+    @level.setter
+    def level(self, value: int):
+        self._level = min(max(value, 0), len(self.quality_levels) - 1)
+        self._slow_frames = 0
+        self._fast_frames = 0
+        self._apply_level()
+
+    def _apply_level(self):
+        quality = self.quality_levels[self._level]
+        self.game.degraded_update_interval = quality.degraded_update_interval
+        self.game.particles_limit_scale = quality.particles_limit_scale
+        self.game.animation_update_interval = quality.animation_update_interval
+
+    def _check_frame_cost(self, _):
+        """
+        Runned every frame.
+
+        Cost of previous frame is added into average, and quality level is changed if needed
+        """
+        # Destroyed governor is updated till the end of frame, but must not change quality anymore
+        if self._is_destroyed:
+            return
+
+        # With fixed timestep entities can be updated few times in one frame
+        if self.game.time == self._checked_time:
+            return
+        self._checked_time = self.game.time
+
+        cost = self.game.frame_cost
+        self.average_cost += (cost - self.average_cost) * self.smoothing
+
+        if self.average_cost > self.frame_budget:
+            self._fast_frames = 0
+            self._slow_frames += 1
+            if self._slow_frames >= self.degrade_after and self._level < len(self.quality_levels) - 1:
+                self.level = self._level + 1
+
+        elif self.average_cost < self.frame_budget * self.restore_ratio:
+            self._slow_frames = 0
+            self._fast_frames += 1
+            if self._fast_frames >= self.restore_after and self._level > 0:
+                self.level = self._level - 1
+
+        else:
+            self._slow_frames = 0
+            self._fast_frames = 0
+
+    def _restore_quality(self):
+        """
+        Runned on destroy of entity.
+        """
+        self._is_destroyed = True
+        self.level = 0
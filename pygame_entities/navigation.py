@@ -0,0 +1,465 @@
+"""
+Pathfinding on navigation grid.
+
+Navigation grid is built from colliders, and can be updated when colliders are moved, added or removed.
+Paths are found with A* by PathfindingService entity, that spreads searches between frames.
+"""
+
+from array import array
+from collections import OrderedDict, deque
+from heapq import heappop, heappush
+from math import floor
+from time import perf_counter
+from typing import Callable, Deque, Dict, Generator, Iterable, List, Tuple, Union
+
+from .game import Game
+from .entities.entity import Entity
+from .entities.mixins import CollisionMixin, VelocityMixin
+from .utils.math import Vector2
+
+# Cost of diagonal move
+_DIAGONAL_COST = 2 ** 0.5
+
+Cell = Tuple[int, int]
+
+
+def static_colliders(game: Union[Game, None] = None) -> List[CollisionMixin]:
+    """
+    Returns enabled not trigger colliders without VelocityMixin
+    """
+    if game is None:
+        game = Game.get_instance()
+
+    return [
+        entity for entity in game.query(CollisionMixin)
+        if not isinstance(entity, VelocityMixin) and not entity.is_trigger
+    ]
+
+
+class NavigationGrid:
+    """
+    Grid of cells, where cell is walkable if it is not covered by any collider.
+
+    For every cell, count of colliders that cover it is kept,
+    so adding/removing/moving collider changes only cells under that collider.
+    """
+
+    def __init__(self, cell_size: int, origin: Vector2, width: int, height: int, path_cache_size=1024) -> None:
+        """
+        cell_size - size of cell in pixels
+
+        origin - world position of top left corner of grid
+
+        width, height - size of grid in cells
+        """
+        self.cell_size = cell_size
+        self.origin = origin
+        self.width = width
+        self.height = height
+
+        # Incremented on every change of walkable cells
+        self.version = 0
+
+        self._blocked = array("H", [0]) * (width * height)
+        # entity id -> (entity, cells rect as (left, top, right, bottom), inclusive)
+        self._colliders: Dict[int, Tuple[CollisionMixin, Tuple[int, int, int, int]]] = dict()
+
+        self.path_cache_size = path_cache_size
+        self._path_cache: "OrderedDict[Tuple[Cell, Cell], Union[Tuple[Cell, ...], None]]" = OrderedDict()
+
+    @staticmethod
+    def from_colliders(colliders: Iterable[CollisionMixin], cell_size: int, padding=0) -> "NavigationGrid":
+        """
+        Creates grid that covers all colliders (and padding pixels around them) and adds colliders into it
+        """
+        colliders = list(colliders)
+        if not colliders:
+            return NavigationGrid(cell_size, Vector2(0, 0), 0, 0)
+
+        rects = [collider.collider_rect for collider in colliders]
+        left = min(rect.left for rect in rects) - padding
+        top = min(rect.top for rect in rects) - padding
+        right = max(rect.right for rect in rects) + padding
+        bottom = max(rect.bottom for rect in rects) + padding
+
+        grid = NavigationGrid(
+            cell_size,
+            Vector2(left, top),
+            -(-(right - left) // cell_size),
+            -(-(bottom - top) // cell_size),
+        )
+        for collider in colliders:
+            grid.add_collider(collider)
+
+        return grid
+
+    def world_to_cell(self, position: Vector2) -> Cell:
+        """
+        Returns cell that contains world position
+        """
+        return (
+            floor((position.x - self.origin.x) / self.cell_size),
+            floor((position.y - self.origin.y) / self.cell_size),
+        )
+
+    def cell_to_world(self, cell: Cell) -> Vector2:
+        """
+        Returns world position of center of cell
+        """
+        return Vector2(
+            self.origin.x + (cell[0] + 0.5) * self.cell_size,
+            self.origin.y + (cell[1] + 0.5) * self.cell_size,
+        )
+
+    def is_walkable(self, cell: Cell) -> bool:
+        """
+        Is cell inside of grid and not covered by colliders
+        """
+        x, y = cell
+        return 0 <= x < self.width and 0 <= y < self.height and self._blocked[y * self.width + x] == 0
+
+    def is_path_walkable(self, path: Union[Tuple[Cell, ...], None]) -> bool:
+        """
+        Are all cells of path walkable, and diagonal moves do not cut corners of blocked cells
+        """
+        if path is None:
+            return False
+
+        for (x, y), (next_x, next_y) in zip(path, path[1:]):
+            if x != next_x and y != next_y and not (
+                    self.is_walkable((next_x, y)) and self.is_walkable((x, next_y))):
+                return False
+        return all(self.is_walkable(cell) for cell in path)
+
+    def _collider_cells(self, collider: CollisionMixin) -> Tuple[int, int, int, int]:
+        """
+        Rect of cells covered by collider, clipped by grid
+        """
+        rect = collider.collider_rect
+        cell_size = self.cell_size
+        return (
+            max(floor((rect.left - self.origin.x) / cell_size), 0),
+            max(floor((rect.top - self.origin.y) / cell_size), 0),
+            min(floor((rect.right - 1 - self.origin.x) / cell_size), self.width - 1),
+            min(floor((rect.bottom - 1 - self.origin.y) / cell_size), self.height - 1),
+        )
+
+    def _change_cells(self, cells: Tuple[int, int, int, int], change: int) -> bool:
+        """
+        Adds change to blocked counts of cells.
+
+        Returns True if walkability of some cell was changed
+        """
+        left, top, right, bottom = cells
+        blocked = self._blocked
+        is_changed = False
+
+        for y in range(top, bottom + 1):
+            row = y * self.width
+            for i in range(row + left, row + right + 1):
+                count = blocked[i] + change
+                blocked[i] = count
+                if count == 0 or (count == 1 and change > 0):
+                    is_changed = True
+
+        return is_changed
+
+    def _on_cells_changed(self, became_blocked: bool):
+        """
+        Removes cached paths that could become wrong
+        """
+        self.version += 1
+
+        if not became_blocked:
+            # Shorter paths or paths that were not found before can exist now
+            self._path_cache.clear()
+            return
+
+        for key in [
+            key for key, path in self._path_cache.items()
+            if path is not None and not all(self.is_walkable(cell) for cell in path)
+        ]:
+            del self._path_cache[key]
+
+    def add_collider(self, collider: CollisionMixin):
+        """
+        Makes cells under collider not walkable.
+
+        If collider is already in grid, it is updated
+        """
+        if collider.id in self._colliders:
+            self.update_collider(collider)
+            return
+
+        cells = self._collider_cells(collider)
+        self._colliders[collider.id] = (collider, cells)
+        if self._change_cells(cells, 1):
+            self._on_cells_changed(True)
+
+    def remove_collider(self, collider: CollisionMixin):
+        """
+        Makes cells under collider walkable again (if they are not covered by other colliders)
+        """
+        _, cells = self._colliders.pop(collider.id, (None, None))
+        if cells is not None and self._change_cells(cells, -1):
+            self._on_cells_changed(False)
+
+    def update_collider(self, collider: CollisionMixin):
+        """
+        Updates cells of collider, that was moved or resized
+        """
+        _, old_cells = self._colliders[collider.id]
+        cells = self._collider_cells(collider)
+        if cells == old_cells:
+            return
+
+        self._colliders[collider.id] = (collider, cells)
+        is_unblocked = self._change_cells(old_cells, -1)
+        is_blocked = self._change_cells(cells, 1)
+
+        if is_unblocked:
+            self._on_cells_changed(False)
+        if is_blocked:
+            self._on_cells_changed(True)
+
+    def refresh(self):
+        """
+        Updates all colliders of grid and removes destroyed colliders
+        """
+        for collider, _ in list(self._colliders.values()):
+            if collider.game.get_entity(collider.id) is not collider:
+                self.remove_collider(collider)
+            else:
+                self.update_collider(collider)
+
+    def search(self, start: Cell, goal: Cell, expansions_per_step=64) -> Generator[None, None, Union[Tuple[Cell, ...], None]]:
+        """
+        A* search between cells, with moves in 8 directions (without cutting corners).
+
+        Generator yields after every expansions_per_step expanded cells, so search can be spread between frames.
+        Result (cells of path from start to goal or None) is returned as StopIteration value.
+
+        If grid was changed during search, result is not cached, because it can be wrong
+        """
+        key = (start, goal)
+        if key in self._path_cache:
+            self._path_cache.move_to_end(key)
+            return self._path_cache[key]
+
+        version = self.version
+        path = None
+        if self.is_walkable(start) and self.is_walkable(goal):
+            path = yield from self._a_star(start, goal, expansions_per_step)
+
+        if self.version != version:
+            return path
+
+        self._path_cache[key] = path
+        if len(self._path_cache) > self.path_cache_size:
+            self._path_cache.popitem(last=False)
+
+        return path
+
+    def find_path(self, start: Cell, goal: Cell) -> Union[Tuple[Cell, ...], None]:
+        """
+        Finds path between cells right now (see search method)
+        """
+        search = self.search(start, goal)
+        while True:
+            try:
+                next(search)
+            except StopIteration as result:
+                return result.value
+
+    def _a_star(self, start: Cell, goal: Cell, expansions_per_step: int):
+        width = self.width
+        height = self.height
+        blocked = self._blocked
+
+        start_index = start[1] * width + start[0]
+        goal_index = goal[1] * width + goal[0]
+        goal_x, goal_y = goal
+
+        came_from: Dict[int, int] = dict()
+        costs: Dict[int, float] = {start_index: 0.0}
+        # (cost + heuristic, counter, cost, index)
+        opened = [(0.0, 0, 0.0, start_index)]
+        counter = 1
+        expansions = 0
+
+        while opened:
+            _, _, cost, index = heappop(opened)
+            if cost > costs[index]:
+                # Cell was pushed again with lower cost, this entry is outdated
+                continue
+            if index == goal_index:
+                break
+
+            expansions += 1
+            if expansions % expansions_per_step == 0:
+                yield
+
+            x = index % width
+            y = index // width
+
+            for dx in (-1, 0, 1):
+                for dy in (-1, 0, 1):
+                    if dx == 0 and dy == 0:
+                        continue
+
+                    nx = x + dx
+                    ny = y + dy
+                    if not (0 <= nx < width and 0 <= ny < height):
+                        continue
+
+                    neighbour = ny * width + nx
+                    if blocked[neighbour]:
+                        continue
+
+                    if dx != 0 and dy != 0:
+                        # Not cutting corners of blocked cells
+                        if blocked[y * width + nx] or blocked[ny * width + x]:
+                            continue
+                        new_cost = cost + _DIAGONAL_COST
+                    else:
+                        new_cost = cost + 1
+
+                    if new_cost >= costs.get(neighbour, new_cost + 1):
+                        continue
+
+                    costs[neighbour] = new_cost
+                    came_from[neighbour] = index
+
+                    # Octile distance
+                    distance_x = abs(goal_x - nx)
+                    distance_y = abs(goal_y - ny)
+                    heuristic = max(distance_x, distance_y) + \
+                        (_DIAGONAL_COST - 1) * min(distance_x, distance_y)
+
+                    heappush(opened, (new_cost + heuristic,
+                             counter, new_cost, neighbour))
+                    counter += 1
+        else:
+            return None
+
+        path = [goal_index]
+        while path[-1] != start_index:
+            path.append(came_from[path[-1]])
+
+        return tuple((index % width, index // width) for index in reversed(path))
+
+
+class PathRequest:
+    """
+    Request of path, created by PathfindingService.request_path
+    """
+
+    def __init__(self, start: Cell, goal: Cell, callback: Callable[[Union[List[Vector2], None]], None]) -> None:
+        self.start = start
+        self.goal = goal
+        self.callback = callback
+        self.cancelled = False
+
+    def cancel(self):
+        """
+        Callback of cancelled request will not be called
+        """
+        self.cancelled = True
+
+
+class PathfindingService(Entity):
+    """
+    Entity that finds paths for requests in background.
+
+    Every frame requests are processed until time_budget (in seconds) is spent,
+    unfinished search is continued on next frame.
+
+    Search is not stopped when grid is changed. When it is finished, found path is checked on changed grid,
+    and search is restarted only if path is blocked now (or path was not found, but cells were changed).
+    """
+
+    def __init__(
+        self, grid: NavigationGrid, time_budget=0.002, auto_refresh=True, max_restarts=3,
+        game: Union[Game, None] = None,
+    ) -> None:
+        """
+        auto_refresh - call grid.refresh() every frame, to track moved and destroyed colliders
+
+        max_restarts - after that count of restarts, search of request is finished in one frame,
+        ignoring time budget, so requests are not delayed forever when grid is changed every frame
+        """
+        super().__init__(Vector2(0, 0), game)
+
+        self.grid = grid
+        self.time_budget = time_budget
+        self.auto_refresh = auto_refresh
+        self.max_restarts = max_restarts
+
+        self._requests: Deque[PathRequest] = deque()
+        self._current_search: Union[Generator, None] = None
+        self._current_search_version = 0
+        self._current_search_restarts = 0
+
+        self.subscribe_on_update(self._process_requests)
+
+    @property
+    def pending_requests_count(self) -> int:
+        return len(self._requests)
+
+    def request_path(
+        self, start: Vector2, goal: Vector2, callback: Callable[[Union[List[Vector2], None]], None]
+    ) -> PathRequest:
+        """
+        Requests path between world positions.
+
+        callback will be called on one of next frames with list of world positions (centers of cells),
+        or with None, if there is no path
+        """
+        request = PathRequest(self.grid.world_to_cell(
+            start), self.grid.world_to_cell(goal), callback)
+        self._requests.append(request)
+        return request
+
+    def _process_requests(self, _):
+        """
+        Runned every frame.
+
+        Continues searches until time budget is spent
+        """
+        if self.auto_refresh:
+            self.grid.refresh()
+
+        start_time = perf_counter()
+
+        while self._requests and perf_counter() - start_time < self.time_budget:
+            request = self._requests[0]
+            if request.cancelled:
+                self._requests.popleft()
+                self._current_search = None
+                self._current_search_restarts = 0
+                continue
+
+            if self._current_search is None:
+                self._current_search = self.grid.search(
+                    request.start, request.goal)
+                self._current_search_version = self.grid.version
+
+            try:
+                next(self._current_search)
+            except StopIteration as result:
+                self._current_search = None
+                cells = result.value
+
+                if self._current_search_version != self.grid.version and not self.grid.is_path_walkable(cells):
+                    # Grid was changed during search, and result can be wrong
+                    if self._current_search_restarts < self.max_restarts:
+                        self._current_search_restarts += 1
+                        continue
+                    cells = self.grid.find_path(request.start, request.goal)
+
+                self._requests.popleft()
+                self._current_search_restarts = 0
+                request.callback(
+                    None if cells is None else [
+                        self.grid.cell_to_world(cell) for cell in cells]
+                )
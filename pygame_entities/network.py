@@ -0,0 +1,498 @@
+"""
+Network state synchronization over UDP.
+
+StateSyncServer is an authoritative server: every send interval it collects states of entities
+(see Entity.write_state) and sends every client only entities in area of interest around its player entity.
+Snapshots are delta compressed against last snapshot that was acknowledged by client.
+
+StateSyncClient receives snapshots, acknowledges them and applies them to its game (see SnapshotLoader).
+
+Sockets are asyncio datagram endpoints, running in event loop on background thread,
+so they work with usual Game.run loop. Received messages are handled on game thread, in updates of entities.
+"""
+
+import asyncio
+import logging
+import struct
+from collections import OrderedDict
+from queue import Empty, SimpleQueue
+from threading import Thread
+from typing import Callable, Dict, List, Tuple, Union
+
+from .game import Game
+from .entities.entity import Entity
+from .snapshot import EntityStates, Snapshot, SnapshotLoader, collect_states, encode_snapshot
+from .utils.math import Vector2
+from .utils.spatial_hash import SpatialHash
+
+logger = logging.getLogger(__name__)
+
+Address = Tuple[str, int]
+
+# Message types, first byte of every datagram
+_HELLO = b"H"
+_WELCOME = b"W"
+_ACK = b"A"
+_INPUT = b"I"
+_BYE = b"B"
+_SNAPSHOT = b"S"
+
+# player entity id / acknowledged frame / baseline frame of snapshot
+_UINT = struct.Struct("<I")
+# Baseline frame of full snapshot
+_NO_BASELINE = 0xFFFFFFFF
+
+# Max size of UDP datagram payload
+MAX_DATAGRAM_SIZE = 65507
+
+
+class _DatagramProtocol(asyncio.DatagramProtocol):
+    def __init__(self, received: SimpleQueue) -> None:
+        self.received = received
+
+    def datagram_received(self, data: bytes, address: Address):
+        self.received.put((data, address))
+
+    def error_received(self, exception: Exception):
+        logger.debug("UDP error: %s", exception)
+
+
+class UdpEndpoint:
+    """
+    UDP socket, that is served by asyncio event loop on background thread.
+
+    Datagrams can be sent and read from any thread
+    """
+
+    def __init__(self, host="127.0.0.1", port=0) -> None:
+        """
+        port=0 - any free port (see address property)
+        """
+        self._received: SimpleQueue = SimpleQueue()
+        self._loop = asyncio.new_event_loop()
+        self._thread = Thread(target=self._loop.run_forever, daemon=True)
+        self._thread.start()
+
+        self._transport, _ = asyncio.run_coroutine_threadsafe(
+            self._loop.create_datagram_endpoint(
+                lambda: _DatagramProtocol(self._received), local_addr=(host, port)),
+            self._loop,
+        ).result()
+        self.address: Address = self._transport.get_extra_info("sockname")[
+            :2]
+
+    def send(self, data: bytes, address: Address):
+        """
+        Sends datagram without waiting. Nothing happens, if endpoint is closed
+        """
+        if self._loop.is_closed():
+            return
+        self._loop.call_soon_threadsafe(self._transport.sendto, data, address)
+
+    def receive_all(self) -> List[Tuple[bytes, Address]]:
+        """
+        Returns all received datagrams as (data, address)
+        """
+        received = list()
+        while True:
+            try:
+                received.append(self._received.get_nowait())
+            except Empty:
+                return received
+
+    async def _close_transport(self):
+        self._transport.close()
+        # Letting transport close its socket
+        await asyncio.sleep(0)
+
+    def close(self):
+        """
+        Closes socket and stops event loop
+        """
+        if self._loop.is_closed():
+            return
+
+        asyncio.run_coroutine_threadsafe(
+            self._close_transport(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+
+class ClientConnection:
+    """
+    Client of StateSyncServer
+    """
+
+    def __init__(self, address: Address, player: Entity, time: float) -> None:
+        self.address = address
+        self.player = player
+        # Game time of last message from client
+        self.last_message_time = time
+
+        self.acked_frame: Union[int, None] = None
+        self.acked_states: Union[EntityStates, None] = None
+        # Sent not acknowledged states: frame -> states
+        self.sent_states: "OrderedDict[int, EntityStates]" = OrderedDict()
+
+    def acknowledge(self, frame: int):
+        """
+        Makes sent states of frame baseline of next snapshots
+        """
+        states = self.sent_states.get(frame)
+        if states is None:
+            # Too old or repeated acknowledgement
+            return
+
+        self.acked_frame = frame
+        self.acked_states = states
+        while self.sent_states:
+            sent_frame = next(iter(self.sent_states))
+            if sent_frame > frame:
+                break
+            del self.sent_states[sent_frame]
+
+
+def _is_replicated(entity: Entity) -> bool:
+    return not isinstance(entity, (StateSyncServer, StateSyncClient))
+
+
+class StateSyncServer(Entity):
+    """
+    Entity that sends states of entities to clients.
+
+    New client gets player entity from player_factory(address), and receives entities
+    in square with half size interest_radius around position of player.
+    Entities that leave that area are removed on client.
+    """
+
+    def __init__(
+        self,
+        player_factory: Callable[[Address], Entity],
+        interest_radius=500.0,
+        send_interval=1,
+        on_input: Union[Callable[[ClientConnection, bytes], None], None] = None,
+        on_disconnect: Union[Callable[[ClientConnection], None], None] = None,
+        replicate: Union[Callable[[Entity], bool], None] = None,
+        client_timeout=5.0,
+        history_size=32,
+        cell_size=128,
+        host="127.0.0.1",
+        port=0,
+        game: Union[Game, None] = None,
+    ) -> None:
+        """
+        send_interval - snapshots are sent once in this count of frames
+
+        on_input - called with bytes sent by StateSyncClient.send_input
+
+        on_disconnect - called when client says bye or does not send anything for client_timeout seconds
+        of game time. By default player entity of client is destroyed
+
+        replicate - entities for which it returns False are not sent (by default network entities)
+
+        history_size - count of not acknowledged snapshots that are kept for every client,
+        if client does not acknowledge snapshots for longer, it gets full snapshot
+        """
+        super().__init__(Vector2(0, 0), game)
+
+        self.player_factory = player_factory
+        self.interest_radius = interest_radius
+        self.send_interval = send_interval
+        self.on_input = on_input
+        self.on_disconnect = on_disconnect if on_disconnect is not None else self._destroy_player
+        self.replicate = replicate if replicate is not None else _is_replicated
+        self.client_timeout = client_timeout
+        self.history_size = history_size
+
+        self.frame = 0
+        self.clients: Dict[Address, ClientConnection] = dict()
+
+        # Positions of replicated entities, for queries of interest
+        self._interest_index = SpatialHash(cell_size)
+        self._indexed_entities: Dict[int, Entity] = dict()
+
+        self._endpoint = UdpEndpoint(host, port)
+        self._frames_to_send = 0
+
+        self.subscribe_on_update(self._update_network)
+        self.subscribe_on_destroy(self.close)
+
+    @property
+    def address(self) -> Address:
+        """
+        Address of server socket
+        """
+        return self._endpoint.address
+
+    def close(self):
+        """
+        Closes socket. Runned on destroy of entity
+        """
+        self._endpoint.close()
+
+    def _update_network(self, _):
+        """
+        Runned every frame.
+
+        Handles received messages and sends snapshots
+        """
+        for data, address in self._endpoint.receive_all():
+            self._handle_message(data, address)
+
+        for connection in [
+            connection for connection in self.clients.values()
+            if self.game.time - connection.last_message_time > self.client_timeout
+        ]:
+            self._disconnect(connection)
+
+        self._frames_to_send -= 1
+        if self._frames_to_send <= 0:
+            self._frames_to_send = self.send_interval
+            self.send_snapshots()
+
+    def _handle_message(self, data: bytes, address: Address):
+        message_type = data[:1]
+        connection = self.clients.get(address)
+
+        if message_type == _HELLO:
+            if connection is None:
+                connection = ClientConnection(
+                    address, self.player_factory(address), self.game.time)
+                self.clients[address] = connection
+            # Welcome is sent again if it was lost
+            self._endpoint.send(
+                _WELCOME + _UINT.pack(connection.player.id), address)
+
+        if connection is None:
+            return
+        connection.last_message_time = self.game.time
+
+        if message_type == _ACK and len(data) == 1 + _UINT.size:
+            connection.acknowledge(_UINT.unpack_from(data, 1)[0])
+        elif message_type == _INPUT and self.on_input is not None:
+            self.on_input(connection, data[1:])
+        elif message_type == _BYE:
+            self._disconnect(connection)
+
+    def _disconnect(self, connection: ClientConnection):
+        del self.clients[connection.address]
+        self.on_disconnect(connection)
+
+    @staticmethod
+    def _destroy_player(connection: ClientConnection):
+        connection.player.destroy()
+
+    def _update_interest_index(self) -> Dict[int, Entity]:
+        """
+        Moves replicated entities in interest index, returns them by id
+        """
+        entities = {
+            entity.id: entity
+            for entities in (self.game.enabled_entities, self.game.disabled_entities)
+            for entity in entities if self.replicate(entity)
+        }
+
+        index = self._interest_index
+        for entity_id in self._indexed_entities:
+            if entity_id not in entities:
+                index.remove(entity_id)
+        for entity_id, entity in entities.items():
+            x, y = entity.position.x, entity.position.y
+            index.insert(entity_id, entity, x, y, x, y)
+
+        self._indexed_entities = entities
+        return entities
+
+    def _interest(self, connection: ClientConnection, entities: Dict[int, Entity]) -> List[int]:
+        """
+        Ids of entities in area of interest of client
+        """
+        position = connection.player.position
+        radius = self.interest_radius
+        left, top = position.x - radius, position.y - radius
+        right, bottom = position.x + radius, position.y + radius
+
+        ids = [
+            entity_id for entity_id in self._interest_index.query_ids(left, top, right, bottom)
+            if left <= entities[entity_id].position.x <= right and top <= entities[entity_id].position.y <= bottom
+        ]
+        if connection.player.id in entities and connection.player.id not in ids:
+            ids.append(connection.player.id)
+        ids.sort()
+        return ids
+
+    def send_snapshots(self):
+        """
+        Sends snapshots to all clients right now (usually called automatically every send_interval frames)
+        """
+        if not self.clients:
+            return
+
+        entities = self._update_interest_index()
+        # States are collected once for entities, that are interesting for few clients
+        states: EntityStates = dict()
+
+        for connection in self.clients.values():
+            interest = self._interest(connection, entities)
+            missing = [entities[entity_id]
+                       for entity_id in interest if entity_id not in states]
+            states.update(collect_states(missing))
+
+            client_states = {entity_id: states[entity_id]
+                             for entity_id in interest}
+            self._send_snapshot(connection, client_states)
+
+        self.frame += 1
+
+    def _send_snapshot(self, connection: ClientConnection, states: EntityStates):
+        baseline = connection.acked_states
+        baseline_frame = connection.acked_frame
+        if baseline_frame is None or self.frame - baseline_frame > self.history_size:
+            baseline = None
+            baseline_frame = _NO_BASELINE
+
+        data = _SNAPSHOT + _UINT.pack(baseline_frame) + \
+            encode_snapshot(self.frame, states, baseline)
+        if len(data) > MAX_DATAGRAM_SIZE:
+            logger.warning("Snapshot for %s is too big (%s bytes), decrease interest_radius",
+                           connection.address, len(data))
+            return
+
+        connection.sent_states[self.frame] = states
+        if len(connection.sent_states) > self.history_size:
+            connection.sent_states.popitem(last=False)
+
+        self._endpoint.send(data, connection.address)
+
+
+class StateSyncClient(Entity):
+    """
+    Entity that connects to StateSyncServer and applies received snapshots to its game.
+
+    Entities are created with entity_factory(type name) (see SnapshotLoader)
+    """
+
+    def __init__(
+        self,
+        server_address: Address,
+        entity_factory: Callable[[str], Entity],
+        hello_interval=0.5,
+        history_size=32,
+        host="127.0.0.1",
+        port=0,
+        game: Union[Game, None] = None,
+    ) -> None:
+        """
+        hello_interval - seconds of game time between connection attempts, until server answers
+
+        history_size - count of received snapshots that are kept as baselines for next snapshots
+        """
+        super().__init__(Vector2(0, 0), game)
+
+        self.server_address = server_address
+        self.hello_interval = hello_interval
+        self.history_size = history_size
+
+        # Id of player entity on server
+        self.player_id: Union[int, None] = None
+        self.last_frame: Union[int, None] = None
+        # Ids of entities on server are not related to ids in this game
+        self.loader = SnapshotLoader(
+            self.game, entity_factory, match_existing=False)
+
+        # Received full states: frame -> states
+        self._history: "OrderedDict[int, EntityStates]" = OrderedDict()
+        self._applied_states: Union[EntityStates, None] = None
+        self._last_hello_time: Union[float, None] = None
+
+        self._endpoint = UdpEndpoint(host, port)
+
+        self.subscribe_on_update(self._update_network)
+        self.subscribe_on_destroy(self.close)
+
+    @property
+    def connected(self) -> bool:
+        return self.player_id is not None
+
+    @property
+    def player(self) -> Union[Entity, None]:
+        """
+        Local copy of player entity (after it was received in snapshot)
+        """
+        if self.player_id is None:
+            return None
+        return self.loader._entities.get(self.player_id)
+
+    def send_input(self, data: bytes):
+        """
+        Sends bytes to on_input function of server
+        """
+        self._endpoint.send(_INPUT + data, self.server_address)
+
+    def close(self):
+        """
+        Says bye to server and closes socket. Runned on destroy of entity
+        """
+        if self.connected:
+            self._endpoint.send(_BYE, self.server_address)
+        self._endpoint.close()
+
+    def _update_network(self, _):
+        """
+        Runned every frame.
+
+        Connects to server and applies received snapshots
+        """
+        if not self.connected and (
+            self._last_hello_time is None or self.game.time - self._last_hello_time >= self.hello_interval
+        ):
+            self._last_hello_time = self.game.time
+            self._endpoint.send(_HELLO, self.server_address)
+
+        for data, address in self._endpoint.receive_all():
+            if address != self.server_address:
+                continue
+
+            message_type = data[:1]
+            if message_type == _WELCOME:
+                self.player_id = _UINT.unpack_from(data, 1)[0]
+            elif message_type == _SNAPSHOT:
+                self._receive_snapshot(data)
+
+    def _receive_snapshot(self, data: bytes):
+        (baseline_frame,) = _UINT.unpack_from(data, 1)
+        snapshot = Snapshot.decode(data[1 + _UINT.size:])
+
+        if self.last_frame is not None and snapshot.frame <= self.last_frame:
+            # Late datagram
+            return
+
+        if snapshot.is_delta:
+            baseline = self._history.get(baseline_frame)
+            if baseline is None:
+                # Baseline is lost, waiting for snapshot with known baseline
+                return
+            states = dict(baseline)
+            for entity_id in snapshot.removed:
+                states.pop(entity_id, None)
+            states.update(snapshot.states)
+        else:
+            states = snapshot.states
+
+        self._history[snapshot.frame] = states
+        while len(self._history) > self.history_size:
+            self._history.popitem(last=False)
+
+        if snapshot.is_delta:
+            # Baselines older than acknowledged one are not used by server anymore
+            for frame in [frame for frame in self._history if frame < baseline_frame]:
+                del self._history[frame]
+
+        self.loader.load(encode_snapshot(
+            snapshot.frame, states, self._applied_states))
+        self._applied_states = states
+        self.last_frame = snapshot.frame
+
+        self._endpoint.send(_ACK + _UINT.pack(snapshot.frame),
+                            self.server_address)
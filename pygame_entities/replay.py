@@ -0,0 +1,139 @@
+"""
+Recording and replaying of pygame events.
+
+Recorder saves events and delta time of every frame into file (one JSON object per line).
+Replay feeds them back into Game.step, so the same scenario can be run again and profiled.
+"""
+
+import json
+from time import perf_counter
+from typing import Any, Dict, List, Sequence, Tuple, Union
+
+from .game import Game
+
+import pygame
+
+# (delta time, events) of one frame
+RecordedFrame = Tuple[float, List[pygame.event.Event]]
+
+
+def _encode_value(value: Any) -> Any:
+    """
+    Converting event attribute to JSON value. Returns None for unsupported values
+    """
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, (tuple, list)):
+        return [_encode_value(item) for item in value]
+    return None
+
+
+def _decode_value(value: Any) -> Any:
+    """
+    Converting JSON value back to event attribute (lists are turned back into tuples)
+    """
+    if isinstance(value, list):
+        return tuple(_decode_value(item) for item in value)
+    return value
+
+
+def encode_events(events: Sequence[pygame.event.Event]) -> List[List[Any]]:
+    """
+    Converts events into JSON compatible lists.
+
+    Attributes that can not be saved (like window objects) are skipped
+    """
+    encoded = list()
+    for event in events:
+        attributes: Dict[str, Any] = dict()
+        for name, value in event.dict.items():
+            encoded_value = _encode_value(value)
+            if encoded_value is not None or value is None:
+                attributes[name] = encoded_value
+        encoded.append([event.type, attributes])
+    return encoded
+
+
+def decode_events(encoded: List[List[Any]]) -> List[pygame.event.Event]:
+    """
+    Converts lists created by encode_events back into events
+    """
+    return [
+        pygame.event.Event(event_type, {
+            name: _decode_value(value) for name, value in attributes.items()
+        })
+        for event_type, attributes in encoded
+    ]
+
+
+class EventRecorder:
+    """
+    Writes events and delta time of every frame into file.
+
+    Set it into game with Game.set_event_recorder method.
+    """
+
+    def __init__(self, path: str) -> None:
+        self._file = open(path, "w")
+
+    def record_frame(self, delta_time: float, events: Sequence[pygame.event.Event]):
+        """
+        Writes one frame into file
+        """
+        self._file.write(json.dumps(
+            {"dt": delta_time, "events": encode_events(events)}))
+        self._file.write("\n")
+
+    def close(self):
+        """
+        Closes file of recording
+        """
+        self._file.close()
+
+    def __enter__(self) -> "EventRecorder":
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+
+def load_recording(path: str) -> List[RecordedFrame]:
+    """
+    Loads frames that were written by EventRecorder
+    """
+    frames = list()
+    with open(path) as file:
+        for line in file:
+            if not line.strip():
+                continue
+            frame = json.loads(line)
+            frames.append((frame["dt"], decode_events(frame["events"])))
+    return frames
+
+
+def replay(recording: Union[str, List[RecordedFrame]], game: Union[Game, None] = None) -> List[float]:
+    """
+    Runs recorded frames through Game.step.
+
+    recording - path to file or frames returned by load_recording
+
+    Game and its entities need to be created the same way, as they were created while recording.
+    Replay stops when frames end or game.running becomes False.
+
+    Returns time spent on each frame in seconds
+    """
+    if isinstance(recording, str):
+        recording = load_recording(recording)
+    if game is None:
+        game = Game.get_instance()
+
+    frame_times = list()
+    for delta_time, events in recording:
+        if not game.running:
+            break
+
+        start = perf_counter()
+        game.step(events, delta_time)
+        frame_times.append(perf_counter() - start)
+
+    return frame_times
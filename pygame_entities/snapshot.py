@@ -0,0 +1,253 @@
+"""
+Snapshots of game state.
+
+Snapshot is a compact binary (struct packed) copy of state of all entities in game.
+Used for save-games and for sending game state to another process.
+
+State of every entity is written by Entity.write_state method, mixins add their own state to it.
+"""
+
+import struct
+from typing import Callable, Dict, Iterable, List, Tuple, Union, TYPE_CHECKING
+if TYPE_CHECKING:
+    from .entities.entity import Entity
+from .game import Game
+
+# magic, is delta, frame, types count, entities count, removed entities count
+_HEADER = struct.Struct("<4s?IHII")
+_MAGIC = b"PGES"
+_TYPE_NAME_LENGTH = struct.Struct("<H")
+# entity id, type index, state length
+_ENTITY_HEADER = struct.Struct("<IHH")
+_ENTITY_ID = struct.Struct("<I")
+
+# entity id -> (type name, state bytes)
+EntityStates = Dict[int, Tuple[str, bytes]]
+
+
+def get_type_name(entity: "Entity") -> str:
+    """
+    Returns name of entity class, that is written in snapshots
+    """
+    entity_type = type(entity)
+    return f"{entity_type.__module__}.{entity_type.__qualname__}"
+
+
+def collect_states(entities: Iterable["Entity"]) -> EntityStates:
+    """
+    Collects states of entities with Entity.write_state method
+    """
+    states = dict()
+    buffer = bytearray()
+
+    for entity in entities:
+        entity.write_state(buffer)
+        states[entity.id] = (get_type_name(entity), bytes(buffer))
+        del buffer[:]
+
+    return states
+
+
+def encode_snapshot(frame: int, states: EntityStates, baseline: Union[EntityStates, None] = None) -> bytes:
+    """
+    Packs states of entities into bytes.
+
+    If baseline is passed, snapshot will be delta: only entities which state was changed since baseline
+    are written, and entities that are not in states anymore are written as removed.
+    """
+    if baseline is None:
+        changed = states
+        removed = []
+    else:
+        changed = {
+            entity_id: state
+            for entity_id, state in states.items()
+            if baseline.get(entity_id) != state
+        }
+        removed = [
+            entity_id for entity_id in baseline.keys() if entity_id not in states
+        ]
+
+    type_indexes: Dict[str, int] = dict()
+    body = bytearray()
+
+    for entity_id, (type_name, state) in changed.items():
+        type_index = type_indexes.setdefault(type_name, len(type_indexes))
+        body.extend(_ENTITY_HEADER.pack(entity_id, type_index, len(state)))
+        body.extend(state)
+
+    for entity_id in removed:
+        body.extend(_ENTITY_ID.pack(entity_id))
+
+    data = bytearray(_HEADER.pack(
+        _MAGIC, baseline is not None, frame, len(type_indexes), len(changed), len(removed)))
+
+    for type_name in type_indexes.keys():
+        encoded_name = type_name.encode()
+        data.extend(_TYPE_NAME_LENGTH.pack(len(encoded_name)))
+        data.extend(encoded_name)
+
+    data.extend(body)
+    return bytes(data)
+
+
+class Snapshot:
+    """
+    Decoded snapshot.
+
+    states - dict with entity id as key and (type name, state bytes) as value
+
+    removed - ids of removed entities (only in delta snapshots)
+    """
+
+    def __init__(self, frame: int, is_delta: bool, states: EntityStates, removed: List[int]) -> None:
+        self.frame = frame
+        self.is_delta = is_delta
+        self.states = states
+        self.removed = removed
+
+    @staticmethod
+    def decode(data: bytes) -> "Snapshot":
+        """
+        Unpacks bytes that were created by encode_snapshot function
+        """
+        view = memoryview(data)
+        magic, is_delta, frame, types_count, entities_count, removed_count = _HEADER.unpack_from(
+            view, 0)
+
+        if magic != _MAGIC:
+            raise ValueError("Data is not a pygame_entities snapshot.")
+
+        offset = _HEADER.size
+
+        type_names = list()
+        for _ in range(types_count):
+            (name_length,) = _TYPE_NAME_LENGTH.unpack_from(view, offset)
+            offset += _TYPE_NAME_LENGTH.size
+            type_names.append(bytes(view[offset:offset + name_length]).decode())
+            offset += name_length
+
+        states = dict()
+        for _ in range(entities_count):
+            entity_id, type_index, state_length = _ENTITY_HEADER.unpack_from(
+                view, offset)
+            offset += _ENTITY_HEADER.size
+            states[entity_id] = (
+                type_names[type_index], bytes(view[offset:offset + state_length]))
+            offset += state_length
+
+        removed = list()
+        for _ in range(removed_count):
+            removed.append(_ENTITY_ID.unpack_from(view, offset)[0])
+            offset += _ENTITY_ID.size
+
+        return Snapshot(frame, is_delta, states, removed)
+
+
+class SnapshotWriter:
+    """
+    Creates full and delta snapshots of all entities in game.
+
+    Delta snapshot contains only changes since previous snapshot of this writer.
+    """
+
+    def __init__(self, game: Union[Game, None] = None) -> None:
+        self.game = game if game is not None else Game.get_instance()
+        self.frame = 0
+        self._baseline: Union[EntityStates, None] = None
+
+    def _collect(self) -> EntityStates:
+        states = collect_states(self.game.enabled_entities)
+        states.update(collect_states(self.game.disabled_entities))
+        return states
+
+    def full(self) -> bytes:
+        """
+        Snapshot with all entities
+        """
+        states = self._collect()
+        data = encode_snapshot(self.frame, states)
+        self._baseline = states
+        self.frame += 1
+        return data
+
+    def delta(self) -> bytes:
+        """
+        Snapshot with entities that were changed, added or removed since previous snapshot.
+
+        If there was no previous snapshot, full snapshot is returned
+        """
+        if self._baseline is None:
+            return self.full()
+
+        states = self._collect()
+        data = encode_snapshot(self.frame, states, self._baseline)
+        self._baseline = states
+        self.frame += 1
+        return data
+
+
+class SnapshotLoader:
+    """
+    Applies snapshots to entities of game.
+
+    Entities from snapshot are matched with existing entities by id and type.
+    If there is no such entity, entity_factory(type_name) is called to create it.
+    Without entity_factory unknown entities are skipped.
+
+    If match_existing=False, only entities created by this loader are matched
+    (for snapshots from another game, where ids are not the same as in this game)
+    """
+
+    def __init__(
+        self,
+        game: Union[Game, None] = None,
+        entity_factory: Union[Callable[[str], "Entity"], None] = None,
+        match_existing=True,
+    ) -> None:
+        self.game = game if game is not None else Game.get_instance()
+        self.entity_factory = entity_factory
+        self.match_existing = match_existing
+        # snapshot entity id -> entity in this game
+        self._entities: Dict[int, "Entity"] = dict()
+
+    def _get_entity(self, entity_id: int, type_name: str) -> Union["Entity", None]:
+        entity = self._entities.get(entity_id)
+        if entity is not None:
+            return entity
+
+        entity = self.game.get_entity(entity_id) if self.match_existing else None
+        if entity is None or get_type_name(entity) != type_name:
+            if self.entity_factory is None:
+                return None
+            entity = self.entity_factory(type_name)
+
+        self._entities[entity_id] = entity
+        return entity
+
+    def _destroy(self, entity_id: int):
+        entity = self._entities.pop(entity_id, None)
+        if entity is not None:
+            entity.destroy()
+
+    def load(self, data: bytes) -> Snapshot:
+        """
+        Applies snapshot to game.
+
+        Entities that are missing in full snapshot and removed entities of delta snapshot are destroyed
+        """
+        snapshot = Snapshot.decode(data)
+
+        for entity_id, (type_name, state) in snapshot.states.items():
+            entity = self._get_entity(entity_id, type_name)
+            if entity is not None:
+                entity.read_state(memoryview(state), 0)
+
+        if snapshot.is_delta:
+            for entity_id in snapshot.removed:
+                self._destroy(entity_id)
+        else:
+            for entity_id in [i for i in self._entities.keys() if i not in snapshot.states]:
+                self._destroy(entity_id)
+
+        return snapshot
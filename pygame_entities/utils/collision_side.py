@@ -1,4 +1,6 @@
-from pygame import Rect
+from typing import Tuple, Union, TYPE_CHECKING
+if TYPE_CHECKING:
+    from pygame import Rect
 
 UP = 0
 DOWN = 1
@@ -6,39 +8,138 @@ LEFT = 2
 RIGHT = 3
 
 
-def check_side_x(a: Rect, b: Rect) -> int:
+def check_side_x(a: "Rect", b: "Rect") -> int:
     """
     Checks where is the a depending on b position on horizontal.
 
     Returns LEFT / RIGHT
     """
-    if a.center[0] > b.center[0]:
+    if a.centerx > b.centerx:
         return RIGHT
     return LEFT
 
 
-def check_side_y(a: Rect, b: Rect) -> int:
+def check_side_y(a: "Rect", b: "Rect") -> int:
     """
     Checks where is the a depending on b position on vertical.
 
     Returns UP / DOWN
     """
-    if a.center[1] > b.center[1]:
+    if a.centery > b.centery:
         return DOWN
     return UP
 
 
-def check_side(a: Rect, b: Rect) -> int:
+def check_side(a: "Rect", b: "Rect") -> int:
     """
     Checks where is the a depending on b position on vertical and horizontal.
 
+    Rects are not changed.
+
     Returns UP / DOWN / LEFT/ RIGHT
     """
-    width_ratio = (a.height + b.height) / (a.width + b.width)
+    return side_from_coords(a.x, a.y, a.width, a.height, b.x, b.y, b.width, b.height)
+
+
+def side_from_coords(ax, ay, aw, ah, bx, by, bw, bh) -> int:
+    """
+    Same as check_side, but takes left, top, width and height of both rects.
+
+    Returns UP / DOWN / LEFT/ RIGHT
+    """
+    # Doubled distance between centers, so there is no division
+    dx = (2 * ax + aw) - (2 * bx + bw)
+    dy = (2 * ay + ah) - (2 * by + bh)
+
+    # Horizontal distance is scaled by (ah + bh) / (aw + bw),
+    # so rects with different proportions are compared fairly
+    if abs(dx) * (ah + bh) > abs(dy) * (aw + bw):
+        return RIGHT if dx > 0 else LEFT
+    return DOWN if dy > 0 else UP
+
+
+def penetration(ax, ay, aw, ah, bx, by, bw, bh) -> Tuple[int, int]:
+    """
+    Checks on which side of b the a is and how deep a is inside b on that side.
+
+    Takes left, top, width and height of both rects.
+
+    Returns tuple (side, depth). Depth is 0 if rects are not overlapping on that side
+    """
+    side = side_from_coords(ax, ay, aw, ah, bx, by, bw, bh)
+
+    if side == UP:
+        depth = ay + ah - by
+    elif side == DOWN:
+        depth = by + bh - ay
+    elif side == RIGHT:
+        depth = bx + bw - ax
+    else:
+        depth = ax + aw - bx
+
+    return side, max(depth, 0)
+
+
+def minimal_translation(ax, ay, aw, ah, bx, by, bw, bh) -> Tuple[int, int]:
+    """
+    Returns (x, y) offset, that needs to be added to a for pushing it out of b.
+
+    Takes left, top, width and height of both rects.
+
+    Offset can be applied in place, for example with Rect.move_ip or Vector2.move_ip
+    """
+    side, depth = penetration(ax, ay, aw, ah, bx, by, bw, bh)
+
+    if side == UP:
+        return 0, -depth
+    elif side == DOWN:
+        return 0, depth
+    elif side == RIGHT:
+        return depth, 0
+    return -depth, 0
+
+
+def segment_rect_intersection(x0, y0, dx, dy, left, top, right, bottom) -> Union[Tuple[float, int, int], None]:
+    """
+    Checks intersection of segment from (x0, y0) to (x0 + dx, y0 + dy) with rect.
+
+    Returns (part, normal x, normal y), where part (0..1) is place on segment where it enters rect,
+    and normal is side of rect that was hit. If segment starts inside of rect, returns (0, 0, 0).
+
+    Returns None if segment does not intersect rect
+    """
+    enter = 0.0
+    leave = 1.0
+    normal_x = 0
+    normal_y = 0
+
+    if dx == 0:
+        if x0 < left or x0 >= right:
+            return None
+    else:
+        if dx > 0:
+            near, far, side = (left - x0) / dx, (right - x0) / dx, -1
+        else:
+            near, far, side = (right - x0) / dx, (left - x0) / dx, 1
+
+        if near > enter:
+            enter, normal_x = near, side
+        leave = min(leave, far)
+
+    if dy == 0:
+        if y0 < top or y0 >= bottom:
+            return None
+    else:
+        if dy > 0:
+            near, far, side = (top - y0) / dy, (bottom - y0) / dy, -1
+        else:
+            near, far, side = (bottom - y0) / dy, (top - y0) / dy, 1
+
+        if near > enter:
+            enter, normal_x, normal_y = near, 0, side
+        leave = min(leave, far)
 
-    a.center = (a.center[0] * width_ratio, a.center[1])
-    b.center = (b.center[0] * width_ratio, b.center[1])
+    if enter > leave:
+        return None
 
-    if abs(a.center[0] - b.center[0]) > abs(a.center[1] - b.center[1]):
-        return check_side_x(a, b)
-    return check_side_y(a, b)
+    return enter, normal_x, normal_y
@@ -1,7 +1,11 @@
 """
 Classes for drawing sprites/sprite animations/etc
 """
-from typing import List, Tuple, Union
+from collections import OrderedDict
+from typing import Dict, List, Tuple, Union, TYPE_CHECKING
+from weakref import WeakSet
+if TYPE_CHECKING:
+    from ..entities.entity import Entity
 
 from ..game import Game
 from ..utils.math import Vector2
@@ -9,6 +13,10 @@ from ..utils.math import Vector2
 import pygame
 
 
+# All not collected sprites, used by diagnostics
+_live_sprites: "WeakSet[BaseSprite]" = WeakSet()
+
+
 class BaseSprite(pygame.sprite.Sprite):
     """
     Base sprite class.
@@ -20,11 +28,22 @@ class BaseSprite(pygame.sprite.Sprite):
     Automatically registering new sprite in game
     """
 
-    def __init__(self, image: pygame.Surface, layer=0, start_position=(0, 0)) -> None:
+    # If True, rect is in world coords and camera position is subtracted from it on drawing
+    world_space = False
+
+    # If True, update can be skipped on some frames when game is slow (see Game.animation_update_interval)
+    skippable_update = False
+
+    # Entity that sprite follows (see attach_to method)
+    _anchor: Union["Entity", None] = None
+
+    def __init__(self, image: pygame.Surface, layer=0, start_position=(0, 0), game: Union[Game, None] = None) -> None:
         """
         Initializing new sprite.
 
         Sprites with bigger layer will be rendered on top of sprites with small layers.
+
+        Sprite is added into game world, by default it is Game.get_instance()
         """
         pygame.sprite.Sprite.__init__(self)
         self._layer = layer
@@ -34,7 +53,7 @@ class BaseSprite(pygame.sprite.Sprite):
         self.image = image
         self.rect = self.image.get_rect()
         self.rect.center = start_position
-        self.game = Game.get_instance()
+        self.game = game if game is not None else Game.get_instance()
         self._visibility = True
 
         # Transform vars
@@ -42,6 +61,7 @@ class BaseSprite(pygame.sprite.Sprite):
 
         # Registering sprite
         self.game.add_sprite(self)
+        _live_sprites.add(self)
 
     @property
     def center_position(self) -> Tuple[int, int]:
@@ -54,6 +74,44 @@ class BaseSprite(pygame.sprite.Sprite):
     def center_position(self, position: Tuple[int, int]):
         self.rect.center = position
 
+    def attach_to(self, entity: "Entity", offset=Vector2()):
+        """
+        Makes sprite follow position of entity (center of sprite = entity.position + offset).
+
+        Position is updated on drawing and only when entity moved, so it does not need update functions
+        """
+        self._anchor = entity
+        self._anchor_offset = offset
+        self._anchor_x = None
+        self._anchor_y = None
+        # Position before last fixed timestep update (see RenderGroup.save_anchor_positions)
+        self._previous_anchor_x = None
+        self._previous_anchor_y = None
+        self.update_anchor_position()
+
+    def detach(self):
+        """
+        Stops following entity that was set by attach_to method
+        """
+        self._anchor = None
+
+    def update_anchor_position(self):
+        """
+        Moves sprite to position of entity that it follows.
+
+        Called automatically on drawing
+        """
+        if self._anchor is None:
+            return
+
+        x = self._anchor.position.x + self._anchor_offset.x
+        y = self._anchor.position.y + self._anchor_offset.y
+
+        if x != self._anchor_x or y != self._anchor_y:
+            self._anchor_x = x
+            self._anchor_y = y
+            self.rect.center = (int(x), int(y))
+
     @property
     def rotation(self) -> float:
         """
@@ -134,33 +192,151 @@ class BaseSprite(pygame.sprite.Sprite):
 
 class SpriteWithCameraOffset(BaseSprite):
     """
-    Combining position of sprite and camera position.
+    Sprite with position in world.
+
+    Rect of this sprite is in world coords, camera position is subtracted from it on drawing.
 
     Based on BaseSprite
     """
 
-    def __init__(self, image, layer=0, start_position=(0, 0)) -> None:
-        super().__init__(image, layer, start_position)
-        self.base_position = start_position
+    world_space = True
 
-    def update(self) -> None:
+    def __init__(self, image, layer=0, start_position=(0, 0), game: Union[Game, None] = None) -> None:
+        super().__init__(image, layer, start_position, game)
+
+    @property
+    def base_position(self) -> Tuple[int, int]:
         """
-        Updates sprite position depending on camera position
+        Center of sprite in world (same as center_position)
         """
-        super().update()
+        return self.rect.center
 
-        self.rect.center = (
-            Vector2(self.base_position[0], self.base_position[1])
-            - self.game._camera_position
-        ).get_integer_tuple()
+    @base_position.setter
+    def base_position(self, position: Tuple[int, int]):
+        self.rect.center = position
 
-    @property
-    def center_position(self) -> Tuple[int, int]:
-        return self.base_position
 
-    @center_position.setter
-    def center_position(self, position: Tuple[int, int]):
-        self.base_position = position
+# Shared cache of rendered texts: (font, text, color) -> surface
+_text_cache: "OrderedDict[Tuple[pygame.font.Font, str, Tuple[int, ...]], pygame.Surface]" = OrderedDict()
+_text_cache_size = 256
+
+# Glyph atlases: (font, color, characters) -> atlas
+_glyph_atlases: Dict[Tuple[pygame.font.Font, Tuple[int, ...], str], "GlyphAtlas"] = dict()
+
+DEFAULT_ATLAS_CHARACTERS = "0123456789+-.,:/% "
+
+
+def set_text_cache_size(size: int):
+    """
+    Sets max count of texts in shared text cache.
+
+    Least recently used texts are removed first
+    """
+    global _text_cache_size
+    _text_cache_size = size
+
+    while len(_text_cache) > _text_cache_size:
+        _text_cache.popitem(last=False)
+
+
+def clear_text_cache():
+    """
+    Removes all texts and glyph atlases from cache
+    """
+    _text_cache.clear()
+    _glyph_atlases.clear()
+
+
+def _render_text_surface(font: pygame.font.Font, text: str, color: Tuple[int, ...]) -> pygame.Surface:
+    text_surface = pygame.Surface(font.size(text), pygame.SRCALPHA)
+    text_surface.blit(font.render(text, 0, color), (0, 0))
+    return text_surface
+
+
+def render_text(font: pygame.font.Font, text: str, color: Tuple[int, ...]) -> pygame.Surface:
+    """
+    Renders text with shared cache.
+
+    Returned surface can be shared between sprites, so do not draw on it
+    """
+    key = (font, text, tuple(color))
+    text_surface = _text_cache.get(key)
+
+    if text_surface is not None:
+        _text_cache.move_to_end(key)
+        return text_surface
+
+    text_surface = _render_text_surface(font, text, key[2])
+    _text_cache[key] = text_surface
+    if len(_text_cache) > _text_cache_size:
+        _text_cache.popitem(last=False)
+
+    return text_surface
+
+
+class GlyphAtlas:
+    """
+    Rendered characters of one font and color.
+
+    Used for texts that change often (like score counters), text is combined from cached characters
+    """
+
+    def __init__(self, font: pygame.font.Font, color: Tuple[int, ...], characters=DEFAULT_ATLAS_CHARACTERS) -> None:
+        self.font = font
+        self.color = tuple(color)
+        self._glyphs = {
+            character: _render_text_surface(font, character, self.color)
+            for character in characters
+        }
+        self._height = max(
+            [glyph.get_height() for glyph in self._glyphs.values()], default=0)
+
+    @staticmethod
+    def get(font: pygame.font.Font, color: Tuple[int, ...], characters=DEFAULT_ATLAS_CHARACTERS) -> "GlyphAtlas":
+        """
+        Returns shared atlas for font, color and characters
+        """
+        key = (font, tuple(color), characters)
+        atlas = _glyph_atlases.get(key)
+        if atlas is None:
+            atlas = GlyphAtlas(font, color, characters)
+            _glyph_atlases[key] = atlas
+        return atlas
+
+    def can_render(self, text: str) -> bool:
+        """
+        Is all characters of text are in this atlas
+        """
+        glyphs = self._glyphs
+        return all(character in glyphs for character in text)
+
+    def render(self, text: str) -> pygame.Surface:
+        """
+        Combines text from cached characters.
+
+        All characters of text need to be in atlas (see can_render)
+        """
+        blit_sequence = list()
+        x = 0
+        for character in text:
+            glyph = self._glyphs[character]
+            blit_sequence.append((glyph, (x, 0)))
+            x += glyph.get_width()
+
+        text_surface = pygame.Surface((x, self._height), pygame.SRCALPHA)
+        text_surface.blits(blit_sequence, doreturn=False)
+        return text_surface
+
+
+def load_font(name: Union[str, None], size: int) -> pygame.font.Font:
+    """
+    Initializes pygame font module (if it is not initialized) and loads font.
+
+    name - path to font file, or None for default pygame font
+    """
+    if not pygame.font.get_init():
+        pygame.font.init()
+    return pygame.font.Font(name, size)
 
 
 class FontSprite(BaseSprite):
@@ -168,25 +344,45 @@ class FontSprite(BaseSprite):
     Sprite for printing text
     """
 
-    def __init__(self, text: str, color: Tuple[int, int, int], font: pygame.font.Font, layer=0, start_position=(0, 0)) -> None:
-        super().__init__(pygame.Surface((0, 0)), layer, start_position)
+    def __init__(self, text: str, color: Tuple[int, int, int], font: pygame.font.Font, layer=0, start_position=(0, 0), game: Union[Game, None] = None, use_glyph_atlas=False) -> None:
+        """
+        If use_glyph_atlas=True, texts that contain only characters from DEFAULT_ATLAS_CHARACTERS
+        are combined from cached characters. Use it for often changing numbers.
+        """
+        if not pygame.font.get_init():
+            pygame.font.init()
+
+        super().__init__(pygame.Surface((0, 0)), layer, start_position, game)
         self.font = font
+        self.use_glyph_atlas = use_glyph_atlas
+
+        self._text = None
+        self._color = None
+        self._rendered_font = None
 
         self.set_text(text, color)
 
     def set_text(self, new_text: str, new_color: Tuple[int, int, int]):
         """
         Sets text of this sprite
+
+        If text, color and font are not changed, nothing happens
         """
-        # Getting size of surface
-        text_size = self.font.size(new_text)
+        new_color = tuple(new_color)
+        if new_text == self._text and new_color == self._color and self.font is self._rendered_font:
+            return
 
-        # Creating new surface
-        new_text_surface = pygame.Surface(text_size, pygame.SRCALPHA)
-        new_text_surface.blit(self.font.render(
-            new_text, 0, new_color), (0, 0))
+        self._text = new_text
+        self._color = new_color
+        self._rendered_font = self.font
 
-        self.image = new_text_surface
+        if self.use_glyph_atlas:
+            atlas = GlyphAtlas.get(self.font, new_color)
+            if atlas.can_render(new_text):
+                self.image = atlas.render(new_text)
+                return
+
+        self.image = render_text(self.font, new_text, new_color)
 
     def set_font(self, new_font: pygame.font.Font):
         """
@@ -200,27 +396,32 @@ class FontSpriteWithCameraOffset(FontSprite, SpriteWithCameraOffset):
     Combined FontSprite and SpriteWithCameraOffset
     """
 
-    def __init__(self, text: str, color: Tuple[int, int, int], font: pygame.font.Font, layer=0, start_position=(0, 0)) -> None:
-        super().__init__(text, color, font, layer, start_position)
+    def __init__(self, text: str, color: Tuple[int, int, int], font: pygame.font.Font, layer=0, start_position=(0, 0), game: Union[Game, None] = None, use_glyph_atlas=False) -> None:
+        super().__init__(text, color, font, layer, start_position, game, use_glyph_atlas)
 
 
 class AnimatedSprite(BaseSprite):
     """
     Sprite with looped changing images by delays.
+
+    Update can be skipped on slow frames, then skipped animation frames are skipped too.
     """
 
-    def __init__(self, frames: List[pygame.Surface], frame_change_delay: float, layer=0, start_position=(0, 0)) -> None:
+    skippable_update = True
+
+    def __init__(self, frames: List[pygame.Surface], frame_change_delay: float, layer=0, start_position=(0, 0), game: Union[Game, None] = None) -> None:
         """
-        frame_change_delay - in seconds
+        frame_change_delay - in seconds, if it is 0, image is changed on every update
         """
 
-        super().__init__(frames[0], layer, start_position)
+        super().__init__(frames[0], layer, start_position, game)
 
         self._frames = frames
         self._current_frame_index = 0
         self._frames_count = len(frames)
         self.frame_change_delay = frame_change_delay
         self._timer = 0.0
+        self._last_update_time = self.game.time
 
     @property
     def frames(self) -> List[pygame.Surface]:
@@ -235,25 +436,31 @@ class AnimatedSprite(BaseSprite):
     def update(self) -> None:
         super().update()
 
-        self._timer += self.game.delta_time
+        # Time since last update, updates can be skipped
+        self._timer += self.game.time - self._last_update_time
+        self._last_update_time = self.game.time
 
-        if self._timer >= self.frame_change_delay:
+        if self.frame_change_delay <= 0:
+            # Image is changed on every update
             self._timer = 0.0
             self._current_frame_index = (
                 self._current_frame_index + 1) % self._frames_count
 
             self.image = self._frames[self._current_frame_index]
 
+        elif self._timer >= self.frame_change_delay:
+            skipped_frames = int(self._timer // self.frame_change_delay)
+            self._timer -= skipped_frames * self.frame_change_delay
+            self._current_frame_index = (
+                self._current_frame_index + skipped_frames) % self._frames_count
+
+            self.image = self._frames[self._current_frame_index]
+
 
 class AnimatedSpriteWithCameraOffset(AnimatedSprite, SpriteWithCameraOffset):
     """
     Combined AnimatedSprite and SpriteWithCameraOffset
     """
 
-    def __init__(self, frames: List[pygame.Surface], frame_change_delay: float, layer=0, start_position=(0, 0)) -> None:
-        super().__init__(frames, frame_change_delay, layer, start_position)
-
-        self.base_position = start_position
-
-    def update(self) -> None:
-        super().update()
+    def __init__(self, frames: List[pygame.Surface], frame_change_delay: float, layer=0, start_position=(0, 0), game: Union[Game, None] = None) -> None:
+        super().__init__(frames, frame_change_delay, layer, start_position, game)
@@ -1,24 +1,29 @@
 import math
+import os
 from typing import Union, Tuple
 
 
-class Vector2:
+class PythonVector2:
     """
     Class for 2-dimensional vector.
 
     Handles operators like + - * /
+
+    Can be used as sequence of 2 numbers (for example, can be passed into pygame.Rect)
     """
 
+    __slots__ = ("x", "y")
+
     def __init__(self, x=0.0, y=0.0) -> None:
         self.x = x
         self.y = y
 
     @staticmethod
-    def from_tuple(xy: Tuple[Union[float, int], Union[float, int]]) -> "Vector2":
+    def from_tuple(xy: Tuple[Union[float, int], Union[float, int]]) -> "PythonVector2":
         """
         Creating new Vector() from tuple with 2 numbers
         """
-        return Vector2(xy[0], xy[1])
+        return PythonVector2(xy[0], xy[1])
 
     def get_tuple(self) -> Tuple[float, float]:
         """
@@ -34,20 +39,29 @@ class Vector2:
         """
         return (int(self.x), int(self.y))
 
-    def __add__(self, other: "Vector2") -> "Vector2":
-        return Vector2(self.x + other.x, self.y + other.y)
+    def move_ip(self, x: Union[float, int], y: Union[float, int]):
+        """
+        Moves this vector by x and y in place.
+
+        Used instead of + operator, when new Vector2 object is not needed
+        """
+        self.x += x
+        self.y += y
+
+    def __add__(self, other: "PythonVector2") -> "PythonVector2":
+        return PythonVector2(self.x + other.x, self.y + other.y)
 
-    def __sub__(self, other: "Vector2") -> "Vector2":
-        return Vector2(self.x - other.x, self.y - other.y)
+    def __sub__(self, other: "PythonVector2") -> "PythonVector2":
+        return PythonVector2(self.x - other.x, self.y - other.y)
 
-    def __mul__(self, other: Union[int, float]) -> "Vector2":
-        return Vector2(self.x * other, self.y * other)
+    def __mul__(self, other: Union[int, float]) -> "PythonVector2":
+        return PythonVector2(self.x * other, self.y * other)
 
-    def __truediv__(self, other: Union[int, float]) -> "Vector2":
-        return Vector2(self.x / other, self.y / other)
+    def __truediv__(self, other: Union[int, float]) -> "PythonVector2":
+        return PythonVector2(self.x / other, self.y / other)
 
-    def __floordiv__(self, other: Union[int, float]) -> "Vector2":
-        return Vector2(self.x // other, self.y // other)
+    def __floordiv__(self, other: Union[int, float]) -> "PythonVector2":
+        return PythonVector2(self.x // other, self.y // other)
 
     def magnitude(self) -> float:
         """
@@ -55,7 +69,7 @@ class Vector2:
         """
         return math.sqrt(self.x**2 + self.y**2)
 
-    def normalized(self) -> "Vector2":
+    def normalized(self) -> "PythonVector2":
         """
         Returns normilized vector.
 
@@ -64,12 +78,12 @@ class Vector2:
         magnitude = self.magnitude()
 
         if magnitude == 0:
-            return Vector2(0, 0)
+            return PythonVector2(0, 0)
 
-        return Vector2(self.x / magnitude, self.y / magnitude)
+        return PythonVector2(self.x / magnitude, self.y / magnitude)
 
     @staticmethod
-    def lerp(a: "Vector2", b: "Vector2", t: float) -> "Vector2":
+    def lerp(a: "PythonVector2", b: "PythonVector2", t: float) -> "PythonVector2":
         """
         Smoothly changing value from a to b.
 
@@ -77,7 +91,13 @@ class Vector2:
 
         0 < t <= 1
         """
-        return Vector2(lerp(a.x, b.x, t), lerp(a.y, b.y, t))
+        return PythonVector2(lerp(a.x, b.x, t), lerp(a.y, b.y, t))
+
+    def __len__(self) -> int:
+        return 2
+
+    def __getitem__(self, index: int) -> Union[float, int]:
+        return (self.x, self.y)[index]
 
     def __repr__(self) -> str:
         return f"Vector2({self.x}, {self.y})"
@@ -101,3 +121,11 @@ def clamp(x: Union[float, int], minimum: Union[float, int], maximum: Union[float
     Using python functions max() and min()
     """
     return min(max(x, minimum), maximum)
+
+
+# Vector2 implementation is chosen on import.
+# With PYGAME_ENTITIES_VECTOR_BACKEND=pygame it is subclass of pygame.math.Vector2 (arithmetic is done in C)
+if os.environ.get("PYGAME_ENTITIES_VECTOR_BACKEND", "python") == "pygame":
+    from .pygame_vector import PygameVector2 as Vector2
+else:
+    Vector2 = PythonVector2
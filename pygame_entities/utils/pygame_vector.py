@@ -0,0 +1,82 @@
+"""
+Vector2 backed by pygame.math.Vector2.
+
+Used as Vector2 of pygame_entities when PYGAME_ENTITIES_VECTOR_BACKEND=pygame environment variable is set.
+"""
+from typing import Union, Tuple
+
+import pygame
+
+__all__ = ["PygameVector2"]
+
+
+class PygameVector2(pygame.math.Vector2):
+    """
+    Subclass of pygame.math.Vector2 with API of pygame_entities Vector2.
+
+    Arithmetic is done by pygame in C, and vectors can be passed into pygame functions without converting.
+
+    Unlike pure python Vector2, vectors are compared by value and * between two vectors is dot product.
+    """
+
+    __slots__ = ()
+
+    @staticmethod
+    def from_tuple(xy: Tuple[Union[float, int], Union[float, int]]) -> "PygameVector2":
+        """
+        Creating new Vector() from tuple with 2 numbers
+        """
+        return PygameVector2(xy[0], xy[1])
+
+    def get_tuple(self) -> Tuple[float, float]:
+        """
+        Gets tuple with x and y in it
+        """
+        return (self.x, self.y)
+
+    def get_integer_tuple(self) -> Tuple[int, int]:
+        """
+        Gets tuple with x and y in it.
+
+        x and y will be rounded to int
+        """
+        return (int(self.x), int(self.y))
+
+    def move_ip(self, x: Union[float, int], y: Union[float, int]):
+        """
+        Moves this vector by x and y in place.
+        """
+        self.x += x
+        self.y += y
+
+    def normalized(self) -> "PygameVector2":
+        """
+        Returns normilized vector.
+
+        For zero vector returns zero vector (pygame normalize() raises error)
+        """
+        if self.x == 0 and self.y == 0:
+            return PygameVector2(0, 0)
+        return self.normalize()
+
+    @staticmethod
+    def lerp(a: "PygameVector2", b: "PygameVector2", t: float) -> "PygameVector2":
+        """
+        Smoothly changing value from a to b.
+
+        Smooth coef is t.
+
+        0 < t <= 1
+        """
+        return PygameVector2(a.x + (b.x - a.x) * t, a.y + (b.y - a.y) * t)
+
+    def __repr__(self) -> str:
+        return f"Vector2({self.x}, {self.y})"
+
+    __str__ = __repr__
+
+
+if type(PygameVector2() + PygameVector2()) is not PygameVector2:
+    raise ImportError(
+        "pygame version is too old for PYGAME_ENTITIES_VECTOR_BACKEND=pygame "
+        "(results of vector arithmetic are not PygameVector2)")
@@ -0,0 +1,186 @@
+"""
+Sprite group for rendering sprites of game by layers.
+"""
+from bisect import bisect_left
+from typing import Callable, Dict, List, Sequence, Tuple, Union
+
+import pygame
+
+
+class RenderGroup(pygame.sprite.AbstractGroup):
+    """
+    Group of sprites, that are drawn by layers.
+
+    Sprites are kept in lists sorted by layer, lists are changed only when sprite is added, removed or changes layer.
+    Every layer is drawn with one Surface.blits call.
+
+    Layer of sprite is taken from sprite._layer (like in pygame.sprite.LayeredUpdates)
+
+    Sprites with world_space=True are drawn with camera offset, sprites attached to entity (see BaseSprite.attach_to)
+    are moved to entity position on drawing. update() is called only for sprites that override update method.
+
+    Sprites with skippable_update=True are updated once in skippable_update_interval calls of update().
+    """
+
+    def __init__(self, *sprites) -> None:
+        # Sorted layers and sprites of each layer (dict is used as ordered set)
+        self._layers: List[Union[int, float]] = list()
+        self._layer_sprites: List[Dict[pygame.sprite.Sprite, None]] = list()
+
+        # Sprites, that have their own update method
+        self._updating_sprites: Dict[pygame.sprite.Sprite, None] = dict()
+        self.skippable_update_interval = 1
+        self._updates_count = 0
+
+        super().__init__()
+        self.add(*sprites)
+
+    def add_internal(self, sprite: pygame.sprite.Sprite, layer: Union[int, float, None] = None):
+        if sprite in self.spritedict:
+            return
+
+        super().add_internal(sprite)
+        if layer is not None:
+            sprite._layer = layer
+
+        # Sprites that are not BaseSprite
+        if not hasattr(sprite, "world_space"):
+            sprite.world_space = False
+            sprite.skippable_update = False
+            sprite._anchor = None
+
+        if type(sprite).update is not pygame.sprite.Sprite.update:
+            self._updating_sprites[sprite] = None
+
+        self._add_to_layer(sprite)
+
+    def remove_internal(self, sprite: pygame.sprite.Sprite):
+        super().remove_internal(sprite)
+        self._updating_sprites.pop(sprite, None)
+        self._remove_from_layer(sprite)
+
+    def _add_to_layer(self, sprite: pygame.sprite.Sprite):
+        layer = getattr(sprite, "_layer", 0)
+        index = bisect_left(self._layers, layer)
+
+        if index == len(self._layers) or self._layers[index] != layer:
+            self._layers.insert(index, layer)
+            self._layer_sprites.insert(index, dict())
+
+        self._layer_sprites[index][sprite] = None
+
+    def _remove_from_layer(self, sprite: pygame.sprite.Sprite):
+        index = bisect_left(self._layers, getattr(sprite, "_layer", 0))
+        sprites = self._layer_sprites[index]
+        del sprites[sprite]
+
+        if not sprites:
+            del self._layers[index]
+            del self._layer_sprites[index]
+
+    def change_layer(self, sprite: pygame.sprite.Sprite, new_layer: Union[int, float]):
+        """
+        Changes layer of sprite.
+
+        Sprite is moved on top of sprites of new layer
+        """
+        if sprite not in self.spritedict:
+            sprite._layer = new_layer
+            return
+
+        self._remove_from_layer(sprite)
+        sprite._layer = new_layer
+        self._add_to_layer(sprite)
+
+    def update(self, *args, **kwargs):
+        """
+        Calls update method of sprites that override it
+        """
+        interval = self.skippable_update_interval
+        if interval <= 1:
+            for sprite in list(self._updating_sprites):
+                sprite.update(*args, **kwargs)
+            return
+
+        # Skippable sprites are spread between calls by their index
+        self._updates_count += 1
+        index = self._updates_count
+        for sprite in list(self._updating_sprites):
+            index += 1
+            if not sprite.skippable_update or index % interval == 0:
+                sprite.update(*args, **kwargs)
+
+    def save_anchor_positions(self):
+        """
+        Saves positions of entities that sprites are attached to, as previous positions for interpolation
+        (see draw method)
+        """
+        for sprite in self.spritedict:
+            anchor = sprite._anchor
+            if anchor is not None:
+                sprite._previous_anchor_x = anchor.position.x + sprite._anchor_offset.x
+                sprite._previous_anchor_y = anchor.position.y + sprite._anchor_offset.y
+
+    def sprites(self) -> List[pygame.sprite.Sprite]:
+        """
+        Sprites sorted by layers
+        """
+        return [sprite for sprites in self._layer_sprites for sprite in sprites]
+
+    def draw(
+        self,
+        surface: pygame.Surface,
+        draw_callbacks: Sequence[Tuple[Union[int, float], Callable[[pygame.Surface], None]]] = (),
+        camera_position: Tuple[int, int] = (0, 0),
+        interpolation_alpha: Union[float, None] = None,
+    ):
+        """
+        Draws all sprites on surface.
+
+        draw_callbacks - sorted by layer list of (layer, function), function(surface) is called after sprites of
+        the same and lower layers are drawn
+
+        camera_position - subtracted from rects of sprites with world_space=True
+
+        interpolation_alpha - if not None, attached sprites are drawn between position saved by
+        save_anchor_positions (alpha=0) and current position of entity (alpha=1)
+        """
+        camera_x, camera_y = camera_position
+        callbacks_count = len(draw_callbacks)
+        callback_index = 0
+
+        for layer, sprites in zip(self._layers, self._layer_sprites):
+            while callback_index < callbacks_count and draw_callbacks[callback_index][0] < layer:
+                draw_callbacks[callback_index][1](surface)
+                callback_index += 1
+
+            blit_sequence = list()
+            for sprite in sprites:
+                rect = sprite.rect
+
+                anchor = sprite._anchor
+                if anchor is not None:
+                    # Same as sprite.update_anchor_position()
+                    x = anchor.position.x + sprite._anchor_offset.x
+                    y = anchor.position.y + sprite._anchor_offset.y
+                    if interpolation_alpha is not None and sprite._previous_anchor_x is not None:
+                        previous_x = sprite._previous_anchor_x
+                        previous_y = sprite._previous_anchor_y
+                        x = previous_x + (x - previous_x) * interpolation_alpha
+                        y = previous_y + (y - previous_y) * interpolation_alpha
+                    if x != sprite._anchor_x or y != sprite._anchor_y:
+                        sprite._anchor_x = x
+                        sprite._anchor_y = y
+                        rect.center = (int(x), int(y))
+
+                if sprite.world_space:
+                    blit_sequence.append(
+                        (sprite.image, (rect.x - camera_x, rect.y - camera_y)))
+                else:
+                    blit_sequence.append((sprite.image, rect))
+
+            surface.blits(blit_sequence, doreturn=False)
+
+        while callback_index < callbacks_count:
+            draw_callbacks[callback_index][1](surface)
+            callback_index += 1
@@ -0,0 +1,268 @@
+"""
+Spatial hash for fast search of objects by area.
+"""
+from math import floor, inf
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+
+Cell = Tuple[int, int]
+
+# Mask that includes all categories of CategorizedSpatialHash
+ALL_CATEGORIES = 0xFFFFFFFF
+
+
+class SpatialHash:
+    """
+    Uniform grid of square cells.
+
+    Every item is stored by id in all cells that its bounds overlap.
+    Bounds are (left, top, right, bottom) with right and bottom excluded, like in pygame.Rect
+    """
+
+    def __init__(self, cell_size=64) -> None:
+        self.cell_size = cell_size
+        self._cells: Dict[Cell, Dict[int, None]] = dict()
+        self._items: Dict[int, Any] = dict()
+        # id -> (left cell, top cell, right cell, bottom cell), inclusive
+        self._item_cells: Dict[int, Tuple[int, int, int, int]] = dict()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __contains__(self, item_id: int) -> bool:
+        return item_id in self._items
+
+    def get(self, item_id: int) -> Any:
+        """
+        Returns item by id or None
+        """
+        return self._items.get(item_id)
+
+    def _cells_range(self, left, top, right, bottom) -> Tuple[int, int, int, int]:
+        cell_size = self.cell_size
+        return (
+            floor(left / cell_size),
+            floor(top / cell_size),
+            floor((right - 1) / cell_size) if right > left else floor(left / cell_size),
+            floor((bottom - 1) / cell_size) if bottom > top else floor(top / cell_size),
+        )
+
+    def insert(self, item_id: int, item: Any, left, top, right, bottom):
+        """
+        Adds item into cells overlapped by bounds.
+
+        If item is already added, it is moved (cells are changed only if they are different)
+        """
+        cells = self._cells_range(left, top, right, bottom)
+        old_cells = self._item_cells.get(item_id)
+
+        self._items[item_id] = item
+        if cells == old_cells:
+            return
+
+        if old_cells is not None:
+            self._remove_from_cells(item_id, old_cells)
+
+        self._item_cells[item_id] = cells
+        grid = self._cells
+        cell_left, cell_top, cell_right, cell_bottom = cells
+        for x in range(cell_left, cell_right + 1):
+            for y in range(cell_top, cell_bottom + 1):
+                cell = grid.get((x, y))
+                if cell is None:
+                    cell = grid[(x, y)] = dict()
+                cell[item_id] = None
+
+    def remove(self, item_id: int):
+        """
+        Removes item. Nothing happens, if there is no item with this id
+        """
+        cells = self._item_cells.pop(item_id, None)
+        if cells is None:
+            return
+
+        del self._items[item_id]
+        self._remove_from_cells(item_id, cells)
+
+    def _remove_from_cells(self, item_id: int, cells: Tuple[int, int, int, int]):
+        grid = self._cells
+        cell_left, cell_top, cell_right, cell_bottom = cells
+        for x in range(cell_left, cell_right + 1):
+            for y in range(cell_top, cell_bottom + 1):
+                cell = grid[(x, y)]
+                del cell[item_id]
+                if not cell:
+                    del grid[(x, y)]
+
+    def cell(self, cell: Cell) -> Iterable[int]:
+        """
+        Ids of items in cell
+        """
+        return self._cells.get(cell, ())
+
+    def query(self, left, top, right, bottom) -> List[Any]:
+        """
+        Returns items from cells overlapped by bounds, sorted by id.
+
+        Items are not checked for overlapping with bounds, only cells are checked
+        """
+        ids = self.query_ids(left, top, right, bottom)
+        ids.sort()
+        items = self._items
+        return [items[item_id] for item_id in ids]
+
+    def query_ids(self, left, top, right, bottom) -> List[int]:
+        """
+        Returns not sorted ids of items from cells overlapped by bounds
+        """
+        cell_left, cell_top, cell_right, cell_bottom = self._cells_range(
+            left, top, right, bottom)
+        grid = self._cells
+
+        if cell_left == cell_right and cell_top == cell_bottom:
+            ids = list(grid.get((cell_left, cell_top), ()))
+        else:
+            found = set()
+            for x in range(cell_left, cell_right + 1):
+                for y in range(cell_top, cell_bottom + 1):
+                    cell = grid.get((x, y))
+                    if cell is not None:
+                        found.update(cell)
+            ids = list(found)
+
+        return ids
+
+    def walk_segment(self, x0: float, y0: float, x1: float, y1: float) -> Iterator[Tuple[Cell, float]]:
+        """
+        Yields cells crossed by segment (see walk_segment function)
+        """
+        return walk_segment(self.cell_size, x0, y0, x1, y1)
+
+
+class CategorizedSpatialHash:
+    """
+    Separate SpatialHash for every category of items.
+
+    Category and mask are integer bitfields. Queries with mask check only hashes of categories
+    that have common bits with mask, so whole groups of items are skipped.
+    """
+
+    def __init__(self, cell_size=64) -> None:
+        self.cell_size = cell_size
+        self._hashes: Dict[int, SpatialHash] = dict()
+        self._item_categories: Dict[int, int] = dict()
+
+    def __len__(self) -> int:
+        return len(self._item_categories)
+
+    def __contains__(self, item_id: int) -> bool:
+        return item_id in self._item_categories
+
+    def get(self, item_id: int) -> Any:
+        """
+        Returns item by id or None
+        """
+        category = self._item_categories.get(item_id)
+        if category is None:
+            return None
+        return self._hashes[category].get(item_id)
+
+    def insert(self, item_id: int, item: Any, category: int, left, top, right, bottom):
+        """
+        Adds or moves item (see SpatialHash.insert)
+        """
+        old_category = self._item_categories.get(item_id)
+        if old_category is not None and old_category != category:
+            self.remove(item_id)
+
+        spatial_hash = self._hashes.get(category)
+        if spatial_hash is None:
+            spatial_hash = self._hashes[category] = SpatialHash(self.cell_size)
+
+        self._item_categories[item_id] = category
+        spatial_hash.insert(item_id, item, left, top, right, bottom)
+
+    def remove(self, item_id: int):
+        """
+        Removes item. Nothing happens, if there is no item with this id
+        """
+        category = self._item_categories.pop(item_id, None)
+        if category is None:
+            return
+
+        spatial_hash = self._hashes[category]
+        spatial_hash.remove(item_id)
+        if not len(spatial_hash):
+            del self._hashes[category]
+
+    def hashes(self, mask=ALL_CATEGORIES) -> List[SpatialHash]:
+        """
+        Hashes of categories that have common bits with mask
+        """
+        return [
+            spatial_hash for category, spatial_hash in self._hashes.items() if category & mask
+        ]
+
+    def query(self, left, top, right, bottom, mask=ALL_CATEGORIES) -> List[Any]:
+        """
+        Returns items of categories from mask, from cells overlapped by bounds, sorted by id
+        """
+        hashes = self.hashes(mask)
+        if len(hashes) == 1:
+            return hashes[0].query(left, top, right, bottom)
+
+        ids = list()
+        for spatial_hash in hashes:
+            ids.extend(spatial_hash.query_ids(left, top, right, bottom))
+        ids.sort()
+
+        get = self.get
+        return [get(item_id) for item_id in ids]
+
+    def walk_segment(self, x0: float, y0: float, x1: float, y1: float) -> Iterator[Tuple[Cell, float]]:
+        """
+        Yields cells crossed by segment (see walk_segment function)
+        """
+        return walk_segment(self.cell_size, x0, y0, x1, y1)
+
+
+def walk_segment(cell_size: int, x0: float, y0: float, x1: float, y1: float) -> Iterator[Tuple[Cell, float]]:
+    """
+    Yields cells crossed by segment from (x0, y0) to (x1, y1) in order from start to end (DDA grid walk).
+
+    With every cell, part of segment (0..1) where segment leaves that cell is yielded
+    """
+    x = floor(x0 / cell_size)
+    y = floor(y0 / cell_size)
+    end_x = floor(x1 / cell_size)
+    end_y = floor(y1 / cell_size)
+
+    dx = x1 - x0
+    dy = y1 - y0
+
+    if dx > 0:
+        step_x, delta_x, max_x = 1, cell_size / dx, ((x + 1) * cell_size - x0) / dx
+    elif dx < 0:
+        step_x, delta_x, max_x = -1, -cell_size / dx, (x * cell_size - x0) / dx
+    else:
+        step_x, delta_x, max_x = 0, inf, inf
+
+    if dy > 0:
+        step_y, delta_y, max_y = 1, cell_size / dy, ((y + 1) * cell_size - y0) / dy
+    elif dy < 0:
+        step_y, delta_y, max_y = -1, -cell_size / dy, (y * cell_size - y0) / dy
+    else:
+        step_y, delta_y, max_y = 0, inf, inf
+
+    while True:
+        exit_part = min(max_x, max_y, 1.0)
+        yield (x, y), exit_part
+
+        if (x == end_x and y == end_y) or exit_part >= 1.0:
+            return
+
+        if max_x < max_y:
+            x += step_x
+            max_x += delta_x
+        else:
+            y += step_y
+            max_y += delta_y
@@ -1,7 +1,11 @@
 from typing import Tuple
+from weakref import WeakSet
 
 import pygame
 
+# All not collected spritesheets, used by diagnostics
+_live_spritesheets: "WeakSet[SpriteSheet]" = WeakSet()
+
 
 class SpriteSheet:
     """
@@ -20,6 +24,8 @@ class SpriteSheet:
         self.sprite_height = sprite_height
         self._spritesheet = spritesheet_surface
 
+        _live_spritesheets.add(self)
+
     def image_at(self, sprite_xy: Tuple[int, int], size=(1, 1)) -> pygame.Surface:
         """
         Returning pygame.Surface with image from spritesheet at certain position
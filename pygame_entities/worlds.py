@@ -0,0 +1,78 @@
+"""
+Running many independent game worlds.
+
+Worlds are created with Game.create_world and stepped with fixed delta time, without window and events.
+run_worlds simulates them in a pool of processes and collects their results.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Any, Callable, Iterable, List, Sequence, Union
+
+from .game import Game
+
+import pygame
+
+
+def step_worlds(worlds: Iterable[Game], delta_time: float, events: Sequence[pygame.event.Event] = ()):
+    """
+    Runs one frame in every world.
+
+    Every world is activated while it is stepped, so Game.get_instance() returns it inside of updates.
+    """
+    for world in worlds:
+        if not world.running:
+            continue
+
+        with world.activate():
+            world.step(events, delta_time)
+
+
+def simulate_world(
+    setup: Callable[[Game, int], None],
+    frames: int,
+    delta_time: float,
+    result: Union[Callable[[Game, int], Any], None],
+    index: int,
+) -> Any:
+    """
+    Creates headless world, calls setup(world, index), runs it for frames count and returns result(world, index).
+
+    Simulation stops early if world.running becomes False.
+    Without result function, count of simulated frames is returned
+    """
+    world = Game.create_world(headless=True)
+
+    with world.activate():
+        setup(world, index)
+
+        simulated_frames = 0
+        while simulated_frames < frames and world.running:
+            world.step((), delta_time)
+            simulated_frames += 1
+
+        if result is None:
+            return simulated_frames
+        return result(world, index)
+
+
+def run_worlds(
+    setup: Callable[[Game, int], None],
+    count: int,
+    frames: int,
+    delta_time: float = 1 / 60,
+    result: Union[Callable[[Game, int], Any], None] = None,
+    processes: Union[int, None] = None,
+) -> List[Any]:
+    """
+    Simulates count worlds in pool of processes (by default one process per CPU core).
+
+    setup and result are called in worker processes, so they need to be picklable (defined on module level).
+
+    Returns list with results of worlds in order of their indexes
+    """
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        return list(executor.map(
+            partial(simulate_world, setup, frames, delta_time, result),
+            range(count),
+        ))